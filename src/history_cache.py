@@ -0,0 +1,129 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import os, shutil, tempfile
+from collections import OrderedDict
+from gi.repository import GdkPixbuf, GLib
+
+################################################################################
+
+class DrHistoryCache():
+	"""Keeps the pixbufs of the states (and keyframes) of an history within a
+	memory budget. When the budget is exceeded, the least recently used pixbufs
+	are written in a cache directory as raw pixels, and their state only knows
+	the path of the file until `load` reloads it."""
+	__gtype_name__ = 'DrHistoryCache'
+
+	def __init__(self, budget_bytes, error_callback, **kwargs):
+		"""`error_callback(exception)` is called when a pixbuf can't be written
+		on the disk, in which case it's kept in memory."""
+		self._budget = budget_bytes
+		self._error_callback = error_callback
+		self._usage = 0
+		self._spill_count = 0
+		self._cache_dir = None
+		# The states whose pixbuf is in memory, from the least recently used
+		# to the most recently used. The keys are the `id` of the dicts.
+		self._in_memory = OrderedDict()
+
+	def get_budget(self):
+		return self._budget
+
+	def get_usage(self):
+		"""Number of bytes used by the pixbufs of the states still in memory."""
+		return self._usage
+
+	def get_spill_count(self):
+		"""Number of times a pixbuf has been written on the disk."""
+		return self._spill_count
+
+	############################################################################
+
+	def add(self, state):
+		"""Start managing the pixbuf of `state`, a dict with a 'pixbuf' key, as
+		the most recently used one."""
+		if state['pixbuf'] is None:
+			return
+		self._in_memory[id(state)] = state
+		self._usage += state['pixbuf'].get_byte_length()
+		self._enforce_budget()
+
+	def load(self, state):
+		"""Ensure the pixbuf of `state` is in memory, and mark it as the most
+		recently used one."""
+		key = id(state)
+		if key in self._in_memory:
+			self._in_memory.move_to_end(key)
+			return
+		if 'cache_path' not in state:
+			return # not managed by this object (e.g. the initial state)
+		state['pixbuf'] = self._read_pixbuf(state)
+		os.remove(state.pop('cache_path'))
+		self.add(state)
+
+	def remove(self, state):
+		"""Stop managing the pixbuf of `state`, and delete its file if it has
+		been written on the disk."""
+		key = id(state)
+		if key in self._in_memory:
+			del self._in_memory[key]
+			self._usage -= state['pixbuf'].get_byte_length()
+		elif 'cache_path' in state:
+			os.remove(state.pop('cache_path'))
+
+	def empty(self):
+		self._in_memory.clear()
+		self._usage = 0
+		if self._cache_dir is not None:
+			shutil.rmtree(self._cache_dir, ignore_errors=True)
+			self._cache_dir = None
+
+	############################################################################
+
+	def _enforce_budget(self):
+		# The most recently used pixbuf is always kept, even if it's alone
+		# bigger than the budget.
+		while self._usage > self._budget and len(self._in_memory) > 1:
+			key, state = self._in_memory.popitem(last=False)
+			try:
+				self._spill(state)
+			except Exception as e:
+				# e.g. no space left on the disk: keep it in memory
+				self._in_memory[key] = state
+				self._in_memory.move_to_end(key, last=False)
+				self._error_callback(e)
+				return
+
+	def _spill(self, state):
+		pixbuf = state['pixbuf']
+		fd, path = tempfile.mkstemp(suffix='.raw', dir=self._get_cache_dir())
+		with os.fdopen(fd, 'wb') as cache_file:
+			cache_file.write(pixbuf.read_pixel_bytes().get_data())
+		state['cache_path'] = path
+		state['cache_format'] = {
+			'has_alpha': pixbuf.get_has_alpha(),
+			'rowstride': pixbuf.get_rowstride()
+		}
+		state['pixbuf'] = None
+		self._usage -= pixbuf.get_byte_length()
+		self._spill_count += 1
+
+	def _read_pixbuf(self, state):
+		with open(state['cache_path'], 'rb') as cache_file:
+			data = GLib.Bytes.new(cache_file.read())
+		cache_format = state.pop('cache_format')
+		return GdkPixbuf.Pixbuf.new_from_bytes(data, \
+		          GdkPixbuf.Colorspace.RGB, cache_format['has_alpha'], 8, \
+		          state['width'], state['height'], cache_format['rowstride'])
+
+	def _get_cache_dir(self):
+		"""The directory is specific to the history, and created only if
+		something has to be written in it."""
+		if self._cache_dir is None:
+			parent_dir = os.path.join(GLib.get_user_cache_dir(), 'drawing')
+			os.makedirs(parent_dir, exist_ok=True)
+			self._cache_dir = tempfile.mkdtemp(prefix='history-', dir=parent_dir)
+		return self._cache_dir
+
+	############################################################################
+################################################################################
+
@@ -1,6 +1,7 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
 from gi.repository import Gdk, Gio, GdkPixbuf, GLib
+from .history_cache import DrHistoryCache
 # from .abstract_tool import WrongToolIdException
 
 ################################################################################
@@ -8,6 +9,13 @@ from gi.repository import Gdk, Gio, GdkPixbuf, GLib
 class DrHistoryManager():
 	__gtype_name__ = 'DrHistoryManager'
 
+	# A keyframe (a copy of the pixbuf, attached to an operation) is added to
+	# the history after this number of operations without any state…
+	KEYFRAME_MAX_OPERATIONS = 20
+	# …or when replaying the operations since the last state would take more
+	# than this duration (in seconds), whichever comes first.
+	KEYFRAME_MAX_DURATION = 1.0
+
 	def __init__(self, image, **kwargs):
 		self._image = image
 
@@ -15,6 +23,33 @@ class DrHistoryManager():
 		self._redo_history = []
 		self._is_saved = True
 		self._waiting_for_rebuild = False
+		self._reset_keyframe_counters()
+
+		# the setting is in megabytes
+		budget = image.window.gsettings.get_int('history-memory-budget')
+		self._cache = DrHistoryCache(budget * 1024 * 1024, self._on_cache_error)
+
+	def get_memory_budget(self):
+		return self._cache.get_budget()
+
+	def get_memory_usage(self):
+		return self._cache.get_usage()
+
+	def get_spill_count(self):
+		return self._cache.get_spill_count()
+
+	def _on_cache_error(self, error):
+		usage = self.get_memory_usage() // (1024 * 1024)
+		budget = self.get_memory_budget() // (1024 * 1024)
+		# Context: an error message, the history is kept in memory instead
+		message = _("The history can't be written on the disk: %s") % str(error)
+		# Context: details about the memory used by the history (in megabytes)
+		details = _("Memory used by the history: %i MB out of %i MB")
+		message += "\n" + details % (usage, budget)
+		# Context: details about the memory used by the history
+		details = _("Images of the history written on the disk: %i")
+		message += "\n" + details % self.get_spill_count()
+		self._image.window.reveal_message(message)
 
 	def get_saved(self):
 		# XXX undoing/redoing doesn't update the title so the "*" isn't visible
@@ -29,6 +64,7 @@ class DrHistoryManager():
 		for op in self._redo_history:
 			self._delete_operation(op)
 		self._delete_operation(self.initial_operation)
+		self._cache.empty()
 
 	def _delete_operation(self, op):
 		for key in op:
@@ -54,7 +90,12 @@ class DrHistoryManager():
 		if operation['tool_id'] is None:
 			self._undo_history.append(operation)
 			self._image.restore_last_state()
+			self._reset_keyframe_counters()
 		else:
+			# Operations may have been added since it has been undone, so its
+			# keyframe may not match the image anymore. A new one will be
+			# created by the counters if it's needed.
+			self._drop_keyframe(operation)
 			self._get_tool(operation['tool_id']).apply_operation(operation)
 
 	def can_undo(self):
@@ -94,7 +135,9 @@ class DrHistoryManager():
 	############################################################################
 	# Serialized operations ####################################################
 
-	def add_operation(self, operation):
+	def add_operation(self, operation, duration=0.0):
+		"""Add an operation which has just been applied to the image, and
+		whose application took `duration` seconds."""
 		self._image.set_surface_as_stable_pixbuf()
 		# print('add_operation_to_history')
 		# print(operation['tool_id'])
@@ -103,6 +146,50 @@ class DrHistoryManager():
 		# 	print('-----------------------------------')
 		self._is_saved = False
 		self._undo_history.append(operation)
+		self._update_keyframes(operation, duration)
+
+	############################################################################
+	# Keyframes ################################################################
+
+	def _reset_keyframe_counters(self):
+		self._nb_ops_since_state = 0
+		self._duration_since_state = 0.0
+
+	def _update_keyframes(self, operation, duration):
+		"""Attach a keyframe to `operation` if too many operations, or too
+		slow ones, would have to be replayed by `_rebuild_from_history`. This
+		bounds the duration of an undo, whatever the length of the history.
+		Keyframes aren't saved states: `_is_saved` isn't changed."""
+		if 'keyframe' in operation:
+			# the operation is replayed, and its keyframe is still valid since
+			# the operations before it are the same
+			self._reset_keyframe_counters()
+			return
+		self._nb_ops_since_state += 1
+		self._duration_since_state += duration
+		if self._nb_ops_since_state < self.KEYFRAME_MAX_OPERATIONS and \
+		           self._duration_since_state < self.KEYFRAME_MAX_DURATION:
+			return
+		if self._image.selection.is_active:
+			# the pixbuf of the selection isn't in the keyframe, so the
+			# operations applied since its creation can't be skipped
+			return
+		pixbuf = self._image.main_pixbuf.copy()
+		operation['keyframe'] = {
+			'tool_id': None,
+			'pixbuf': pixbuf,
+			'width': pixbuf.get_width(),
+			'height': pixbuf.get_height()
+		}
+		self._cache.add(operation['keyframe'])
+		self._reset_keyframe_counters()
+
+	def _drop_keyframe(self, operation):
+		if 'keyframe' in operation:
+			self._cache.remove(operation.pop('keyframe'))
+
+	def _is_state_or_keyframe(self, operation):
+		return operation['tool_id'] is None or 'keyframe' in operation
 
 	############################################################################
 	# Cached pixbufs ###########################################################
@@ -123,43 +210,55 @@ class DrHistoryManager():
 		if pixbuf is None:
 			# Context: an error message
 			raise Exception(_("Attempt to save an invalid state"))
-		self._undo_history.append({
+		state = {
 			'tool_id': None,
 			'pixbuf': pixbuf,
 			'width': pixbuf.get_width(),
 			'height': pixbuf.get_height()
-		})
+		}
+		self._undo_history.append(state)
+		self._cache.add(state)
 		self._is_saved = True
+		self._reset_keyframe_counters()
 
 	def has_initial_pixbuf(self):
 		return self.initial_operation['pixbuf'] is not None
 
 	def get_last_saved_state(self):
-		index = self._get_last_state_index(False)
+		index = self._get_last_state_index()
 		if index == -1:
 			return self.initial_operation
+		operation = self._undo_history[index]
+		if operation['tool_id'] is None:
+			state = operation
 		else:
-			return self._undo_history[index]
+			state = operation['keyframe']
+		# its pixbuf may have been written on the disk to save memory
+		self._cache.load(state)
+		return state
 
-	def _get_last_state_index(self, allow_yeeting_states):
+	def _get_last_state_index(self):
 		"""Return the index of the last "state" operation (dict whose 'tool_id'
-		value is None) in the undo-history. If there is no such operation, the
-		returned index is -1 which means the only known state is the
-		self.initial_operation attribute."""
-
-		returned_index = -1
-		nbPixbufs = 0
-		for op in self._undo_history:
-			if op['tool_id'] is None:
-				last_saved_pixbuf_op = op
-				returned_index = self._undo_history.index(op)
-				nbPixbufs += 1
-
-		# TODO if there are too many pixbufs in the history, remove a few ones
-		# Issue #200, needs more design because saving can change the data
-
-		# print("returned_index : " + str(returned_index))
-		return returned_index
+		value is None), or of the last operation with a keyframe, in the
+		undo-history. If there is no such operation, the returned index is -1
+		which means the only known state is the self.initial_operation
+		attribute."""
+
+		# The history is read backwards, so it stops at the last state instead
+		# of always scanning everything.
+		for index in range(len(self._undo_history) - 1, -1, -1):
+			if self._is_state_or_keyframe(self._undo_history[index]):
+				return index
+
+		# The pixbufs of the states are limited by the memory budget of the
+		# cache, which writes the least recently used ones on the disk (#200)
+		return -1
+
+	def get_replay_plan(self):
+		"""Return a DrReplayPlan describing how `_rebuild_from_history` would
+		rebuild the image from the current undo-history."""
+		last_state_index = self._get_last_state_index()
+		return DrReplayPlan(self._undo_history, last_state_index)
 
 	############################################################################
 	# Other private methods ####################################################
@@ -182,17 +281,13 @@ class DrHistoryManager():
 			return False
 		self._waiting_for_rebuild = False
 
-		last_save_index = self._get_last_state_index(True)
+		plan = self.get_replay_plan()
 		self._image.restore_last_state()
-		history = self._undo_history.copy()
-		self._undo_history = []
-		for op in history:
-			if history.index(op) > last_save_index:
-				# print("do", op['tool_id'])
-				self._get_tool(op['tool_id']).simple_apply_operation(op)
-			else:
-				# print("skip", op['tool_id'])
-				self._undo_history.append(op)
+		self._reset_keyframe_counters()
+		self._undo_history = plan.skipped_operations.copy()
+		for op in plan.applied_operations:
+			# the operation is added back to the history when it's applied
+			self._get_tool(op['tool_id']).simple_apply_operation(op)
 		self._image.update()
 		return False
 
@@ -210,4 +305,22 @@ class DrHistoryManager():
 	############################################################################
 ################################################################################
 
+class DrReplayPlan():
+	"""The operations of an undo-history, split according to the last state
+	(or keyframe) found in it: the image is restored from this state, so the
+	operations until it are skipped, and the ones after it are applied again."""
+	__gtype_name__ = 'DrReplayPlan'
+
+	def __init__(self, history, last_state_index):
+		# -1 if the image is restored from the initial state
+		self.last_state_index = last_state_index
+		self.skipped_operations = history[:last_state_index + 1]
+		self.applied_operations = history[last_state_index + 1:]
+
+	def get_nb_applied(self):
+		return len(self.applied_operations)
+
+	############################################################################
+################################################################################
+
 
@@ -21,7 +21,9 @@ from .history_manager import DrHistoryManager
 from .selection_manager import DrSelectionManager
 from .properties import DrPropertiesDialog
 from .utilities_files import InvalidFileFormatException
+from .utilities_mipmaps import DrMipmaps
 from .utilities_overlay import utilities_generic_canvas_outline
+from .utilities_sampling import utilities_invalidate_sampling
 
 class DrMotionBehavior():
 	_LIMIT = 10
@@ -57,6 +59,9 @@ class DrImage(Gtk.Box):
 	# Maximal level of zoom (crisp rendering only)
 	ZOOM_MAX = 2000
 
+	# Size (in pixels of the image) of the tiles invalidated by a damaged area
+	DAMAGE_TILE_SIZE = 64
+
 	def __init__(self, window, **kwargs):
 		super().__init__(**kwargs)
 		self.window = window
@@ -75,6 +80,25 @@ class DrImage(Gtk.Box):
 		self._rendering_is_locked = False
 		self._framerate_hint = 0
 
+		# Areas of the image changed by the tool since the last redraw, and by
+		# the previous redraw, as [x1, y1, x2, y2] (or None if unknown)
+		self._damage = None
+		self._previous_damage = None
+
+		# The surface is created from the main pixbuf when the image is loaded
+		self.surface = None
+		# Copy of the surface corresponding to `_stable_pixbuf`, used to restore
+		# only the area (`_restore_area`) changed since the last restoration
+		self._stable_surface = None
+		self._stable_pixbuf = None
+		self._forget_restore_area()
+
+		# Downscaled copies of the main pixbuf, to render the image zoomed out.
+		# They can only be used as is if the surface hasn't been given to a
+		# tool since it has been restored from the main pixbuf.
+		self._mipmaps = DrMipmaps()
+		self._surface_is_stable = False
+
 		self._ctrl_pressed = False
 
 		if self.window.devel_mode:
@@ -190,7 +214,9 @@ class DrImage(Gtk.Box):
 		height = state_op['height']
 		self.set_temp_pixbuf(self._new_blank_pixbuf(1, 1))
 		self.selection.init_pixbuf()
+		utilities_invalidate_sampling(self.surface)
 		self.surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+		self._forget_restore_area()
 		if pixbuf is None:
 			# no pixbuf in the operation: the restored state is a blank one
 			rgba = state_op['rgba']
@@ -329,6 +355,7 @@ class DrImage(Gtk.Box):
 			self.selection.reset(False)
 			self.main_pixbuf = None
 			self.temp_pixbuf = None
+			utilities_invalidate_sampling(self.surface)
 			self._history.empty_history()
 			return True
 		else:
@@ -370,8 +397,8 @@ class DrImage(Gtk.Box):
 		self.set_action_sensitivity('redo', self._history.can_redo())
 		# self.update_history_actions_labels()
 
-	def add_to_history(self, operation):
-		self._history.add_operation(operation)
+	def add_to_history(self, operation, duration=0.0):
+		self._history.add_operation(operation, duration)
 
 	def should_replace(self):
 		if self._history.can_undo():
@@ -422,16 +449,20 @@ class DrImage(Gtk.Box):
 		# Zoom level
 		cairo_context.scale(self.zoom_level, self.zoom_level)
 
+		# Only the part of the image which is visible and has to be redrawn is
+		# painted, so panning a huge image doesn't convert or filter the rest
+		drawn_rect = self._get_drawn_rect(cairo_context)
+
 		# Image (with scroll position)
-		cairo_context.set_source_surface(self.get_surface(), \
-		                                 -1 * self.scroll_x, -1 * self.scroll_y)
-		if self.is_zoomed_surface_sharp():
-			cairo_context.get_source().set_filter(cairo.FILTER_NEAREST)
-		cairo_context.paint()
+		mipmap_level = self._get_mipmap_level()
+		if mipmap_level is not None:
+			self._paint_mipmap_level(cairo_context, drawn_rect, *mipmap_level)
+		else:
+			self._paint_surface_part(cairo_context, self.surface, drawn_rect)
 
 		# What the tool shows on the canvas, upon what it paints, for example an
 		# overlay to imply how to interact with a previewed operation.
-		self.active_tool().on_draw_above(area, cairo_context)
+		self.active_tool().on_draw_above(area, cairo_context, drawn_rect)
 
 		# Limit of the canvas (for readability)
 		utilities_generic_canvas_outline(cairo_context, self.zoom_level, \
@@ -483,7 +514,7 @@ class DrImage(Gtk.Box):
 					self._skipped_frames += 1
 				return
 			self._rendering_is_locked = True
-			self.update()
+			self.update_damaged()
 			GLib.timeout_add(self._framerate_hint, self._async_unlock, {})
 
 		else: # self.motion_behavior == DrMotionBehavior.SLIP:
@@ -533,16 +564,165 @@ class DrImage(Gtk.Box):
 	def _get_tool_tooltip(self, ev_x, ev_y):
 		return self.active_tool().get_tooltip(ev_x, ev_y ,self.motion_behavior)
 
+	def _get_mipmap_level(self):
+		"""Return the mipmap level (surface, scale) to use to render the image
+		at the current zoom level, or None if the surface should be used."""
+		if self.zoom_level >= 1.0:
+			return None
+		if self._surface_is_stable:
+			source = self.surface
+		elif self._restore_area_is_known and self._can_restore_area():
+			# the tool reports its changes, which are painted upon the level
+			source = self._get_stable_surface()
+		else:
+			return None
+		return self._mipmaps.get_level(source, self.zoom_level)
+
+	def _paint_mipmap_level(self, cairo_context, drawn_rect, level, scale):
+		self._paint_surface_part(cairo_context, level, drawn_rect, scale)
+		if self._surface_is_stable or self._restore_area is None:
+			return
+
+		# The area changed by the tool since the last restoration of the surface
+		# is painted from the surface itself
+		x1, y1, x2, y2 = self._restore_area
+		x1 = math.floor(x1) - 1 - self.scroll_x
+		y1 = math.floor(y1) - 1 - self.scroll_y
+		x2 = math.ceil(x2) + 1 - self.scroll_x
+		y2 = math.ceil(y2) + 1 - self.scroll_y
+		cairo_context.save()
+		cairo_context.rectangle(x1, y1, x2 - x1, y2 - y1)
+		cairo_context.clip()
+		x, y, width, height = drawn_rect
+		x1 = max(x1, x)
+		y1 = max(y1, y)
+		x2 = min(x2, x + width)
+		y2 = min(y2, y + height)
+		restored_rect = (x1, y1, x2 - x1, y2 - y1)
+		self._paint_surface_part(cairo_context, self.surface, restored_rect)
+		cairo_context.restore()
+
+	def _get_drawn_rect(self, cairo_context):
+		"""Return the visible area of the image, limited to the area the widget
+		is redrawing (see `update_damaged`), with a margin for the filtering of
+		the pixels. It's an (x, y, width, height) tuple in the coordinates of
+		`cairo_context`, which is zoomed but not scrolled."""
+		x, y, width, height = self.get_visible_rect()
+		clip_x1, clip_y1, clip_x2, clip_y2 = cairo_context.clip_extents()
+		x1 = max(x - self.scroll_x, clip_x1)
+		y1 = max(y - self.scroll_y, clip_y1)
+		x2 = min(x + width - self.scroll_x, clip_x2)
+		y2 = min(y + height - self.scroll_y, clip_y2)
+		margin = 1 + math.ceil(1 / self.zoom_level)
+		x1 = math.floor(x1) - margin
+		y1 = math.floor(y1) - margin
+		x2 = math.ceil(x2) + margin
+		y2 = math.ceil(y2) + margin
+		return (x1, y1, x2 - x1, y2 - y1)
+
+	def _paint_surface_part(self, cairo_context, surface, rect, scale=1.0):
+		"""Paint, at the current scroll position, the part of `surface` inside
+		`rect`, an area of `cairo_context` as returned by `_get_drawn_rect`.
+		The size of `surface` is `scale` times the size of the image."""
+		x, y, width, height = rect
+		x1 = max(0, math.floor((x + self.scroll_x) * scale))
+		y1 = max(0, math.floor((y + self.scroll_y) * scale))
+		x2 = min(surface.get_width(), \
+		                       math.ceil((x + width + self.scroll_x) * scale))
+		y2 = min(surface.get_height(), \
+		                      math.ceil((y + height + self.scroll_y) * scale))
+		if x2 <= x1 or y2 <= y1:
+			return
+		subsurface = surface.create_for_rectangle(x1, y1, x2 - x1, y2 - y1)
+		cairo_context.save()
+		cairo_context.scale(1 / scale, 1 / scale)
+		source_x = x1 - self.scroll_x * scale
+		source_y = y1 - self.scroll_y * scale
+		cairo_context.set_source_surface(subsurface, source_x, source_y)
+		if self.is_zoomed_surface_sharp():
+			cairo_context.get_source().set_filter(cairo.FILTER_NEAREST)
+		cairo_context.paint()
+		cairo_context.restore()
+
+	def paint_pixbuf_part(self, cairo_context, pixbuf, x, y, rect):
+		"""Used by tools to paint `pixbuf` at (x, y) in the `cairo_context`
+		given to their `on_draw_above` method, but only its part inside `rect`
+		(in the same coordinates), or the whole pixbuf if `rect` is None. Only
+		this part is converted to a surface, since the subpixbuf shares its
+		pixels with `pixbuf`."""
+		x1 = 0
+		y1 = 0
+		if rect is not None:
+			x1 = max(0, math.floor(rect[0] - x))
+			y1 = max(0, math.floor(rect[1] - y))
+			x2 = min(pixbuf.get_width(), math.ceil(rect[0] + rect[2] - x))
+			y2 = min(pixbuf.get_height(), math.ceil(rect[1] + rect[3] - y))
+			if x2 <= x1 or y2 <= y1:
+				return
+			pixbuf = pixbuf.new_subpixbuf(x1, y1, x2 - x1, y2 - y1)
+		Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, x + x1, y + y1)
+		if self.is_zoomed_surface_sharp():
+			cairo_context.get_source().set_filter(cairo.FILTER_NEAREST)
+		cairo_context.paint()
+
 	def update(self):
 		# print('image.py: _drawing_area.queue_draw')
+		self._previous_damage = self._damage
+		self._damage = None
 		self._drawing_area.queue_draw()
 
+	def add_damage(self, x, y, width, height):
+		"""Tools call this to report the area (in image coordinates) changed by
+		the operation they're previewing, so `update_damaged` can redraw only
+		this area of the widget."""
+		rect = [x, y, x + width, y + height]
+		self._damage = self._get_damage_union(self._damage, rect)
+		if self._restore_area_is_known:
+			self._restore_area = self._get_damage_union(self._restore_area, rect)
+
+	def update_damaged(self):
+		"""Like `update`, but only the tiles of the widget which contain the
+		area reported with `add_damage` are redrawn. The area damaged before the
+		previous redraw is redrawn too, since the preview may have shrunk. If no
+		area has been reported, everything is redrawn."""
+		if self._damage is None:
+			self.update()
+			return
+		damage = self._get_damage_union(self._damage, self._previous_damage)
+		self._previous_damage = self._damage
+		self._damage = None
+
+		# the area is extended to the tiles, with a margin for the antialiasing
+		tile = self.DAMAGE_TILE_SIZE
+		x1 = math.floor((damage[0] - 1) / tile) * tile
+		y1 = math.floor((damage[1] - 1) / tile) * tile
+		x2 = math.ceil((damage[2] + 1) / tile) * tile
+		y2 = math.ceil((damage[3] + 1) / tile) * tile
+
+		# in the widget, the image is scrolled and zoomed
+		widget_x = math.floor((x1 - self.scroll_x) * self.zoom_level)
+		widget_y = math.floor((y1 - self.scroll_y) * self.zoom_level)
+		widget_w = math.ceil((x2 - x1) * self.zoom_level) + 1
+		widget_h = math.ceil((y2 - y1) * self.zoom_level) + 1
+		self._drawing_area.queue_draw_area(widget_x, widget_y, widget_w, widget_h)
+
+	def _get_damage_union(self, rect1, rect2):
+		if rect1 is None:
+			return rect2
+		if rect2 is None:
+			return rect1
+		return [min(rect1[0], rect2[0]), min(rect1[1], rect2[1]), \
+		        max(rect1[2], rect2[2]), max(rect1[3], rect2[3])]
+
 	def _async_unlock(self, content_params={}):
 		"""This is used as a GSourceFunc so it should return False."""
 		self._rendering_is_locked = False
 		return False
 
 	def get_surface(self):
+		# the caller may draw on the surface, so it can't be rendered using the
+		# mipmaps anymore
+		self._surface_is_stable = False
 		return self.surface
 
 	def on_enter_image(self, *args):
@@ -556,22 +736,91 @@ class DrImage(Gtk.Box):
 		self.update()
 
 	def set_surface_as_stable_pixbuf(self):
+		if self._restore_area_is_known and self._can_restore_area():
+			# the surface has only been changed in the restoration area
+			if self._restore_area is not None:
+				x1, y1, x2, y2 = self._restore_area
+				self._mipmaps.invalidate(x1 - 1, y1 - 1, x2 + 1, y2 + 1)
+		else:
+			self._mipmaps.invalidate_all()
 		w = self.surface.get_width()
 		h = self.surface.get_height()
 		self.main_pixbuf = Gdk.pixbuf_get_from_surface(self.surface, 0, 0, w, h)
+		self._forget_restore_area()
+		self._surface_is_stable = True
 		self._framerate_hint = math.sqrt(w * h) - 1000
 		self._framerate_hint = int(self._framerate_hint * 0.2)
 		# between 500 and 33ms (= between 2 and 30 fps)
 		self._framerate_hint = max(33, min(500, self._framerate_hint))
 		# print("image.py: hint =", self._framerate_hint)
 
-	def use_stable_pixbuf(self):
+	def use_stable_pixbuf(self, only_damaged=False):
 		"""This is called by tools' `restore_pixbuf`, so at the beginning of
-		each operation (even unapplied)."""
-		# maybe the "scale" parameter should be 1 instead of 0
-		self.surface = Gdk.cairo_surface_create_from_pixbuf(self.main_pixbuf, 0, None)
-		# print('image.py: use_stable_pixbuf')
-		self.surface.set_device_scale(self.SCALE_FACTOR, self.SCALE_FACTOR)
+		each operation (even unapplied). If `only_damaged` is true, the caller
+		promises to report with `add_damage` all the changes it will do to the
+		surface, so the next restoration can be limited to this area instead of
+		converting the whole pixbuf again.
+		Returns the restored area (x1, y1, x2, y2), or None if the whole
+		surface has been restored."""
+		restored_area = None
+		if only_damaged and self._can_restore_area():
+			restored_area = self._restore_area_from_stable_surface()
+		else:
+			utilities_invalidate_sampling(self.surface)
+			# maybe the "scale" parameter should be 1 instead of 0
+			self.surface = Gdk.cairo_surface_create_from_pixbuf( \
+			                                         self.main_pixbuf, 0, None)
+			# print('image.py: use_stable_pixbuf')
+			self.surface.set_device_scale(self.SCALE_FACTOR, self.SCALE_FACTOR)
+			if only_damaged:
+				# the copy is only made if an area has to be restored, which
+				# never happens when the history is replayed
+				self._stable_surface = None
+				self._stable_pixbuf = self.main_pixbuf
+		self._restore_area = None
+		self._restore_area_is_known = only_damaged
+		self._surface_is_stable = True
+		return restored_area
+
+	def _forget_restore_area(self):
+		"""The surface may have been changed anywhere, so the next restoration
+		will be a complete one."""
+		self._restore_area = None
+		self._restore_area_is_known = False
+
+	def _get_stable_surface(self):
+		"""The surface corresponding to `_stable_pixbuf`, created when it's
+		needed for the first time."""
+		if self._stable_surface is None:
+			self._stable_surface = Gdk.cairo_surface_create_from_pixbuf( \
+			                                       self._stable_pixbuf, 0, None)
+			self._stable_surface.set_device_scale(self.SCALE_FACTOR, \
+			                                                  self.SCALE_FACTOR)
+		return self._stable_surface
+
+	def _can_restore_area(self):
+		if not self._restore_area_is_known or self._stable_pixbuf is None:
+			return False
+		# the main pixbuf may have been replaced since the copy
+		return self._stable_pixbuf is self.main_pixbuf
+
+	def _restore_area_from_stable_surface(self):
+		if self._restore_area is None:
+			# nothing has been drawn since the last restoration
+			return [0, 0, 0, 0]
+		x1, y1, x2, y2 = self._restore_area
+		# with a margin for the antialiasing
+		x1 = math.floor(x1) - 1
+		y1 = math.floor(y1) - 1
+		x2 = math.ceil(x2) + 1
+		y2 = math.ceil(y2) + 1
+		cairo_context = cairo.Context(self.surface)
+		cairo_context.rectangle(x1, y1, x2 - x1, y2 - y1)
+		cairo_context.clip()
+		cairo_context.set_source_surface(self._get_stable_surface(), 0, 0)
+		cairo_context.set_operator(cairo.Operator.SOURCE)
+		cairo_context.paint()
+		return [x1, y1, x2, y2]
 
 	def get_pixbuf_width(self):
 		return self.main_pixbuf.get_width()
@@ -586,15 +835,25 @@ class DrImage(Gtk.Box):
 			raise NoPixbufNoChangeException('main_pixbuf')
 		else:
 			self.main_pixbuf = new_pixbuf
+			self._mipmaps.invalidate_all()
 
 	############################################################################
 	# Temporary pixbuf management ##############################################
 
-	def set_temp_pixbuf(self, new_pixbuf):
+	def set_temp_pixbuf(self, new_pixbuf, size=None):
+		"""The temp pixbuf can be a preview at a reduced resolution, in which
+		case `size` is the (width, height) of the pixbuf it represents."""
 		if new_pixbuf is None:
 			raise NoPixbufNoChangeException('temp_pixbuf')
 		else:
 			self.temp_pixbuf = new_pixbuf
+			if size is None:
+				size = (new_pixbuf.get_width(), new_pixbuf.get_height())
+			self._temp_size = size
+
+	def get_temp_size(self):
+		"""The size of the temp pixbuf, at the resolution of the image."""
+		return self._temp_size
 
 	def reset_temp(self):
 		self.set_temp_pixbuf(self._new_blank_pixbuf(1, 1))
@@ -657,6 +916,16 @@ class DrImage(Gtk.Box):
 		visible_height = int(self.get_widget_height() / self.zoom_level)
 		return visible_width, visible_height
 
+	def get_visible_rect(self):
+		"""Return the area of the image visible in the widget, as (x, y, width,
+		height) in pixels of the image. It's not limited to the size of the
+		image, since tools can show things beyond it."""
+		x = math.floor(self.scroll_x)
+		y = math.floor(self.scroll_y)
+		x2 = self.scroll_x + self.get_widget_width() / self.zoom_level
+		y2 = self.scroll_y + self.get_widget_height() / self.zoom_level
+		return (x, y, math.ceil(x2) - x, math.ceil(y2) - y)
+
 	############################################################################
 	# Scroll and zoom levels ###################################################
 
@@ -664,14 +933,14 @@ class DrImage(Gtk.Box):
 		# Indirect way to know if it's a transform tool
 		if self.active_tool().menu_id == 1:
 			if not self.active_tool().apply_to_selection:
-				return self.temp_pixbuf.get_width() + 12
+				return self.get_temp_size()[0] + 12
 		return self.get_pixbuf_width()
 
 	def get_previewed_height(self):
 		# Indirect way to know if it's a transform tool
 		if self.active_tool().menu_id == 1:
 			if not self.active_tool().apply_to_selection:
-				return self.temp_pixbuf.get_height() + 12
+				return self.get_temp_size()[1] + 12
 		return self.get_pixbuf_height()
 
 	def fake_scrollbar_update(self):
@@ -712,8 +981,7 @@ class DrImage(Gtk.Box):
 	def get_nineths_sizes(self, apply_to_selection, x1, y1):
 		"""Returns the sizes of the 'nineths' of the image used for example by
 		'scale' or 'crop' to decide the cursor they'll show."""
-		height = self.temp_pixbuf.get_height()
-		width = self.temp_pixbuf.get_width()
+		width, height = self.get_temp_size()
 		if not apply_to_selection:
 			x1 = 0
 			y1 = 0
@@ -140,7 +140,10 @@ class DrSelectionManager():
 		cairo_context.close_path()
 		return cairo_context.copy_path()
 
-	def show_selection_on_surface(self, cairo_context, with_scroll, tool_dx, tool_dy):
+	def show_selection_on_surface(self, cairo_context, with_scroll, \
+	                                      tool_dx, tool_dy, visible_rect=None):
+		"""Paint the selection pixbuf, or only its part inside `visible_rect`
+		if it's not None."""
 		if self.selection_pixbuf is None:
 			raise NoSelectionPixbufException()
 		if with_scroll:
@@ -149,10 +152,8 @@ class DrSelectionManager():
 		else:
 			x = self.selection_x + tool_dx
 			y = self.selection_y + tool_dy
-		Gdk.cairo_set_source_pixbuf(cairo_context, self.selection_pixbuf, x, y)
-		if self.image.is_zoomed_surface_sharp():
-			cairo_context.get_source().set_filter(cairo.FILTER_NEAREST)
-		cairo_context.paint()
+		pixbuf = self.selection_pixbuf
+		self.image.paint_pixbuf_part(cairo_context, pixbuf, x, y, visible_rect)
 
 	def get_center_coords(self):
 		"""Return the coords of the center of the selection."""
@@ -15,7 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import cairo
+import cairo, time
 from gi.repository import Gtk, Gdk
 
 class WrongToolIdException(Exception):
@@ -46,6 +46,9 @@ class AbstractAbstractTool():
 		self.use_operator = False
 		# The tool's state
 		self.cursor_name = 'cell'
+		# If the tool reports all its changes with `add_damage_from_extents`,
+		# only the damaged area is restored at each preview.
+		self.reports_damage = False
 		self._ongoing_operation = False
 		self._modifier_keys = []
 		self._last_btn = 1
@@ -289,8 +292,10 @@ class AbstractAbstractTool():
 	def simple_apply_operation(self, operation):
 		"""Simpler apply_operation, for the 'rebuild from history' method."""
 		try:
+			time0 = time.monotonic()
 			self.do_tool_operation(operation)
-			self.get_image().add_to_history(operation)
+			duration = time.monotonic() - time0
+			self.get_image().add_to_history(operation, duration)
 		except Exception as e:
 			self.show_error(str(e))
 		self._ongoing_operation = False
@@ -332,8 +337,14 @@ class AbstractAbstractTool():
 	def non_destructive_show_modif(self):
 		self.get_image().update()
 
+	def add_damage_from_extents(self, extents):
+		"""Report to the image the area changed by the operation, as returned
+		by the `*_extents` methods of a cairo context."""
+		x1, y1, x2, y2 = extents
+		self.get_image().add_damage(x1, y1, x2 - x1, y2 - y1)
+
 	def restore_pixbuf(self):
-		self.get_image().use_stable_pixbuf()
+		return self.get_image().use_stable_pixbuf(self.reports_damage)
 
 	############################################################################
 	# Signals handling #########################################################
@@ -350,7 +361,10 @@ class AbstractAbstractTool():
 	def on_release_on_area(self, event, surface, event_x, event_y):
 		pass
 
-	def on_draw_above(self, area, cairo_context):
+	def on_draw_above(self, area, cairo_context, visible_rect):
+		"""Show things upon the image. `cairo_context` is zoomed, and the image
+		is at (-scroll_x, -scroll_y). Only the area `visible_rect` (x, y, width,
+		height, in the coordinates of `cairo_context`) will be visible."""
 		pass
 
 	############################################################################
@@ -19,6 +19,7 @@ import cairo
 from .abstract_tool import AbstractAbstractTool
 from .optionsbar_classic import OptionsBarClassic
 from .utilities_colors import utilities_gdk_rgba_to_normalized_array
+from .utilities_strokes import DrIncrementalStroke
 
 class AbstractClassicTool(AbstractAbstractTool):
 	__gtype_name__ = 'AbstractClassicTool'
@@ -37,6 +38,7 @@ class AbstractClassicTool(AbstractAbstractTool):
 		self._operator = cairo.Operator.OVER
 		self.x_press = 0
 		self.y_press = 0
+		self._stroke = None
 		self._use_antialias = self.load_tool_action_boolean('antialias', \
 		                                                     'use-antialiasing')
 		# XXX honteusement sous-performant ^
@@ -78,6 +80,10 @@ class AbstractClassicTool(AbstractAbstractTool):
 			self.secondary_color = utilities_gdk_rgba_to_normalized_array(left_c)
 		self._operator = self.window.options_manager.get_operator()[0]
 
+	def cancel_ongoing_operation(self):
+		self.end_incremental_stroke()
+		super().cancel_ongoing_operation()
+
 	############################################################################
 	# Operations common methods ################################################
 
@@ -124,4 +130,41 @@ class AbstractClassicTool(AbstractAbstractTool):
 		cairo_context.set_dash(dashes_descriptor)
 
 	############################################################################
+	# Incremental previews of strokes ##########################################
+
+	def start_incremental_stroke(self, layers, smooth, square_caps=False):
+		"""Start previewing a stroke with `preview_incremental_stroke`. The
+		tool has to report the damages of its other operations, see
+		`DrIncrementalStroke` for the meaning of the parameters."""
+		self._stroke = DrIncrementalStroke(self.get_surface(), layers, smooth, \
+		                                       self._use_antialias, square_caps)
+
+	def preview_incremental_stroke(self, points, operator):
+		"""Preview the stroke along `points` by only painting what changed
+		since the previous frame, instead of restoring the whole image and
+		stroking the whole path again."""
+		changes = self._stroke.update(points)
+		if changes is None:
+			return
+		# the changed area has to be restored too, since it may already contain
+		# the stroke painted by the previous frames
+		self.add_damage_from_extents(changes)
+		restored_area = self.restore_pixbuf()
+		self._ongoing_operation = True
+		cairo_context = self.get_context()
+		cairo_context.set_operator(operator)
+		self._stroke.paint(cairo_context, restored_area)
+		self.add_damage_from_extents(changes)
+
+	def end_incremental_stroke(self):
+		"""Stop the preview, and ensure the next restoration of the image will
+		erase everything it painted."""
+		if self._stroke is None:
+			return
+		extents = self._stroke.get_extents()
+		if extents is not None:
+			self.add_damage_from_extents(extents)
+		self._stroke = None
+
+	############################################################################
 ################################################################################
@@ -1,6 +1,15 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
-import cairo
+import cairo, math
+
+# Number of masks kept to be reused by the next operations
+MASKS_POOL_SIZE = 2
+# The sizes of the masks are rounded up to this, so they can be reused more
+MASKS_SIZE_STEP = 256
+
+_masks_pool = []
+
+################################################################################
 
 class AbstractBrush():
 	__gtype_name__ = 'AbstractBrush'
@@ -12,6 +21,11 @@ class AbstractBrush():
 	def _get_tips(self, use_pressure, brush_direction):
 		return [_("Brush")]
 
+	def get_incremental_preview_width(self, line_width):
+		"""The width of the preview if it's a simple stroke with round caps and
+		joins, which can be rendered incrementally, or None otherwise."""
+		return None
+
 	############################################################################
 
 	def draw_preview(self, operation, cairo_context):
@@ -36,10 +50,15 @@ class AbstractBrush():
 		# Creation of a blank surface with a new context; each brush decides how
 		# to apply the options set by the user (`operation`), except for the
 		# operator which has to be "wrongly" set to SOURCE.
-		w = self._tool.get_surface().get_width()
-		h = self._tool.get_surface().get_height()
-		mask = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
+		# The surface only covers the area of the image which can be changed by
+		# the stroke, so the cost doesn't depend on the size of the image.
+		x, y, w, h = self._get_mask_area(operation)
+		if w <= 0 or h <= 0:
+			return
+		pooled_mask = _get_pooled_mask(w, h)
+		mask = pooled_mask.create_for_rectangle(0, 0, w, h)
 		context2 = cairo.Context(mask)
+		context2.translate(-1 * x, -1 * y)
 
 		if operation['antialias']:
 			antialias = cairo.Antialias.DEFAULT
@@ -54,8 +73,32 @@ class AbstractBrush():
 
 		# Paint the surface onto the actual image with the chosen operator
 		original_context.set_operator(operation['operator'])
-		original_context.set_source_surface(mask)
+		original_context.set_source_surface(mask, x, y)
 		original_context.paint()
+		_release_pooled_mask(pooled_mask)
+
+	def _get_mask_area(self, operation):
+		"""Return the area (x, y, width, height) of the image which can be
+		changed by the stroke: the extents of its points, with a margin for the
+		widest line (the pressure can double the width) and for the smoothing
+		(which can move the curve away from the points by 10% of the length of
+		the segments)."""
+		path = operation['path']
+		max_length = 0
+		for previous, current in zip(path, path[1:]):
+			length = math.sqrt((current['x'] - previous['x']) ** 2 + \
+			                   (current['y'] - previous['y']) ** 2)
+			max_length = max(max_length, length)
+		margin = operation['line_width'] * 2 + 2 + max_length * 0.1
+
+		surface = self._tool.get_surface()
+		xs = [pt['x'] for pt in path]
+		ys = [pt['y'] for pt in path]
+		x1 = max(0, math.floor(min(xs) - margin))
+		y1 = max(0, math.floor(min(ys) - margin))
+		x2 = min(surface.get_width(), math.ceil(max(xs) + margin))
+		y2 = min(surface.get_height(), math.ceil(max(ys) + margin))
+		return x1, y1, x2 - x1, y2 - y1
 
 	############################################################################
 
@@ -68,3 +111,29 @@ class AbstractBrush():
 	############################################################################
 ################################################################################
 
+def _get_pooled_mask(width, height):
+	"""Return a surface at least as big as `width` × `height`, with this area
+	blank. It's the smallest fitting surface of the pool, or a new one."""
+	fitting = [m for m in _masks_pool \
+	                   if m.get_width() >= width and m.get_height() >= height]
+	if len(fitting) == 0:
+		width = math.ceil(width / MASKS_SIZE_STEP) * MASKS_SIZE_STEP
+		height = math.ceil(height / MASKS_SIZE_STEP) * MASKS_SIZE_STEP
+		return cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+
+	mask = min(fitting, key=lambda m: m.get_width() * m.get_height())
+	_masks_pool.remove(mask)
+	cairo_context = cairo.Context(mask)
+	cairo_context.rectangle(0, 0, width, height)
+	cairo_context.set_operator(cairo.Operator.CLEAR)
+	cairo_context.fill()
+	return mask
+
+def _release_pooled_mask(mask):
+	_masks_pool.append(mask)
+	if len(_masks_pool) > MASKS_POOL_SIZE:
+		# the oldest one is forgotten
+		_masks_pool.pop(0)
+
+################################################################################
+
@@ -16,6 +16,10 @@ class BrushSimple(AbstractBrush):
 			label += _("Width depends on the mouse speed")
 		return [label]
 
+	def get_incremental_preview_width(self, line_width):
+		# same as the width used by `do_brush_operation` for previews
+		return max(1, int(line_width / 2))
+
 	def draw_preview(self, operation, cairo_context):
 		cairo_context.set_line_cap(cairo.LineCap.ROUND)
 		cairo_context.set_line_join(cairo.LineJoin.ROUND)
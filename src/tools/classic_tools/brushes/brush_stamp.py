@@ -0,0 +1,161 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, math, random
+from collections import OrderedDict
+from .abstract_brush import AbstractBrush
+
+# Number of rendered tips kept in memory
+TIPS_CACHE_SIZE = 32
+
+_tips_cache = OrderedDict()
+
+################################################################################
+
+class BrushStamp(AbstractBrush):
+	"""Brush stamping a pre-rendered tip along the path, at regular intervals.
+	The tips are alpha masks, rendered once for each shape and size, and the
+	color is applied when they're stamped, so the cache doesn't depend on it.
+	Other brushes can use this engine with other parameters, or by overriding
+	`_draw_tip`."""
+	__gtype_name__ = 'BrushStamp'
+
+	def __init__(self, brush_id, brush_tool, label, tip, *args):
+		"""`tip` describes the shape of the tip: its 'shape' ('round', 'spray'
+		or 'bristle'), its 'hardness' (the part of the radius where it's
+		opaque), and the 'spacing' between 2 stamps, relatively to its size."""
+		super().__init__(brush_id, brush_tool)
+		self._label = label
+		self._tip = tip
+
+	def _get_tips(self, use_pressure, brush_direction):
+		label = self._label + " - "
+		if use_pressure:
+			label += _("Width depends on the stylus pressure")
+		else:
+			label += _("Constant width")
+		return [label]
+
+	############################################################################
+
+	def do_brush_operation(self, cairo_context, operation):
+		"""The stamps are painted on one mask, even for previews since it's
+		fast enough."""
+		self.operation_on_mask(operation, cairo_context)
+
+	def do_masked_brush_op(self, cairo_context, operation):
+		# The operator (SOURCE, to paint on the mask) interpolates between the
+		# color and the previous stamps, so the color's alpha is the maximal
+		# opacity of the stroke, whatever the overlapping of the stamps.
+		for x, y, size in self._get_stamps(operation):
+			tip = self._get_tip(size)
+			x -= tip.get_width() / 2
+			y -= tip.get_height() / 2
+			if not operation['antialias']:
+				x = round(x)
+				y = round(y)
+			cairo_context.mask_surface(tip, x, y)
+
+	############################################################################
+	# Private methods ##########################################################
+
+	def _get_stamps(self, operation):
+		"""Resample the path into a list of (x, y, size) stamps, separated by a
+		distance depending on their size. The pressure, if any, is
+		interpolated between the points."""
+		stamps = []
+		previous = None
+		distance_left = 0 # before the next stamp
+		for pt in operation['path']:
+			if previous is None:
+				size = self._get_size(operation['line_width'], pt['p'])
+				stamps.append((pt['x'], pt['y'], size))
+				distance_left = self._get_spacing(size)
+				previous = pt
+				continue
+
+			dx = pt['x'] - previous['x']
+			dy = pt['y'] - previous['y']
+			length = math.sqrt(dx * dx + dy * dy)
+			travelled = 0
+			while length - travelled >= distance_left:
+				travelled += distance_left
+				ratio = travelled / length
+				pressure = pt['p']
+				if pressure is not None and previous['p'] is not None:
+					pressure = previous['p'] + (pt['p'] - previous['p']) * ratio
+				size = self._get_size(operation['line_width'], pressure)
+				stamps.append((previous['x'] + dx * ratio, \
+				                           previous['y'] + dy * ratio, size))
+				distance_left = self._get_spacing(size)
+			distance_left -= length - travelled
+			previous = pt
+		return stamps
+
+	def _get_size(self, line_width, pressure):
+		"""A 50% pressure gives the base width, like with the simple brush.
+		The sizes are rounded, so there are few tips to render."""
+		if pressure is not None:
+			line_width = line_width * pressure * 2
+		return max(1, round(line_width))
+
+	def _get_spacing(self, size):
+		return max(1.0, size * self._tip['spacing'])
+
+	def _get_tip(self, size):
+		key = (self._tip['shape'], self._tip['hardness'], size)
+		if key in _tips_cache:
+			_tips_cache.move_to_end(key)
+			return _tips_cache[key]
+
+		# with a margin for the antialiasing
+		tip_width = size + 2
+		tip = cairo.ImageSurface(cairo.Format.A8, tip_width, tip_width)
+		cairo_context = cairo.Context(tip)
+		cairo_context.translate(tip_width / 2, tip_width / 2)
+		self._draw_tip(cairo_context, size / 2)
+
+		_tips_cache[key] = tip
+		if len(_tips_cache) > TIPS_CACHE_SIZE:
+			_tips_cache.popitem(last=False)
+		return tip
+
+	def _draw_tip(self, cairo_context, radius):
+		"""Draw the tip, centered on (0, 0), with opaque pixels where it should
+		be painted."""
+		hardness = self._tip['hardness']
+		# seeded by the size, so the tip is the same each time it's rendered
+		generator = random.Random(radius)
+
+		if self._tip['shape'] == 'spray':
+			nb_droplets = max(1, int(radius * radius))
+			for i in range(nb_droplets):
+				angle = generator.uniform(0, 2 * math.pi)
+				distance = radius * math.sqrt(generator.random())
+				cairo_context.rectangle(math.cos(angle) * distance, \
+				                        math.sin(angle) * distance, 1, 1)
+			cairo_context.fill()
+
+		elif self._tip['shape'] == 'bristle':
+			nb_hairs = max(3, int(radius))
+			hair_radius = max(0.5, radius / 6)
+			for i in range(nb_hairs):
+				angle = generator.uniform(0, 2 * math.pi)
+				distance = (radius - hair_radius) * math.sqrt(generator.random())
+				cairo_context.new_sub_path()
+				cairo_context.arc(math.cos(angle) * distance, \
+				                  math.sin(angle) * distance, \
+				                  hair_radius, 0, 2 * math.pi)
+			cairo_context.fill()
+
+		else: # self._tip['shape'] == 'round':
+			gradient = cairo.RadialGradient(0, 0, 0, 0, 0, radius)
+			gradient.add_color_stop_rgba(0, 0.0, 0.0, 0.0, 1.0)
+			gradient.add_color_stop_rgba(hardness, 0.0, 0.0, 0.0, 1.0)
+			gradient.add_color_stop_rgba(1, 0.0, 0.0, 0.0, 0.0)
+			cairo_context.set_source(gradient)
+			cairo_context.arc(0, 0, radius, 0, 2 * math.pi)
+			cairo_context.fill()
+
+	############################################################################
+################################################################################
+
@@ -17,6 +17,9 @@ class AbstractEraser():
 	def use_size(self):
 		return False
 
+	def has_live_preview(self):
+		return True
+
 	def on_motion(self, cairo_context, press, event, path=None):
 		return self.on_release(cairo_context, press, event, path)
 
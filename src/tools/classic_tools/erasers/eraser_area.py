@@ -2,6 +2,8 @@
 
 import cairo, random
 from .abstract_eraser import AbstractEraser
+from .utilities_arrays import utilities_numpy_is_available, \
+                              utilities_surface_as_array, numpy
 from .utilities_blur import utilities_blur_surface, BlurType, BlurDirection
 
 class EraserArea(AbstractEraser):
@@ -24,7 +26,8 @@ class EraserArea(AbstractEraser):
 				'blur': _("Blur"),
 				'shuffle': _("Shuffle pixels"),
 				'mixed': _("Shuffle and blur"),
-				'mosaic': _("Mosaic")
+				'mosaic': _("Mosaic"),
+				'mosaic_average': _("Mosaic (average colors)")
 			}[options['eraser-type']]
 		return label_options
 
@@ -69,8 +72,11 @@ class EraserArea(AbstractEraser):
 		shuffle_intensity = int((width * height) / 2)
 		if censor_type == 'mosaic':
 			bs = utilities_blur_surface(surface, b_rad, BlurType.TILES, b_dir)
+		elif censor_type == 'mosaic_average':
+			b_type = BlurType.TILES_AVERAGE
+			bs = utilities_blur_surface(surface, b_rad, b_type, b_dir)
 		elif censor_type == 'blur':
-			bs = utilities_blur_surface(surface, b_rad, BlurType.PX_BOX, b_dir)
+			bs = utilities_blur_surface(surface, b_rad, BlurType.AUTO, b_dir)
 		elif censor_type == 'shuffle':
 			bs = self._shuffle_pixels(surface, shuffle_intensity)
 		elif censor_type == 'mixed':
@@ -89,6 +95,8 @@ class EraserArea(AbstractEraser):
 		channels = 4 # ARGB
 		if w <= 1 or h <= 1:
 			return surface
+		if utilities_numpy_is_available():
+			return self._shuffle_pixels_numpy(surface, iterations)
 
 		pixels = surface.get_data()
 
@@ -98,6 +106,26 @@ class EraserArea(AbstractEraser):
 			self._shuffle_one_iteration(w, h, channels, pixels)
 		return surface
 
+	def _shuffle_pixels_numpy(self, surface, iterations):
+		"""Same principle as the pure-python version, but all the pairs of
+		pixels to swap are drawn at once. The pairs don't share any pixel, so
+		the swaps can all be done in one step. The generator is seeded, so the
+		result is the same each time the history is rebuilt."""
+		pixels = utilities_surface_as_array(surface)
+		# each pixel is seen as one 32-bits integer, so they're swapped whole
+		flat_pixels = pixels.view(numpy.uint32).reshape(pixels.shape[0:2])
+		nb_pixels = flat_pixels.size
+		nb_swaps = min(int(iterations), nb_pixels // 2)
+
+		generator = numpy.random.default_rng(1)
+		chosen = generator.permutation(nb_pixels)[:2 * nb_swaps]
+		indexes1 = numpy.unravel_index(chosen[:nb_swaps], flat_pixels.shape)
+		indexes2 = numpy.unravel_index(chosen[nb_swaps:], flat_pixels.shape)
+		flat_pixels[indexes1], flat_pixels[indexes2] = \
+		                       flat_pixels[indexes2], flat_pixels[indexes1]
+		surface.mark_dirty()
+		return surface
+
 	def _shuffle_one_iteration(self, w, h, channels, pixels):
 		pix1_x = random.randint(0, w - 1)
 		pix1_y = random.randint(0, h - 1)
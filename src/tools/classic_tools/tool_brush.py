@@ -22,6 +22,7 @@ from .brush_simple import BrushSimple
 from .brush_airbrush import BrushAirbrush
 from .brush_nib import BrushNib
 from .brush_hairy import BrushHairy
+from .brush_stamp import BrushStamp
 
 class ToolBrush(AbstractClassicTool):
 	__gtype_name__ = 'ToolBrush'
@@ -36,6 +37,12 @@ class ToolBrush(AbstractClassicTool):
 			'airbrush': BrushAirbrush('airbrush', self),
 			'calligraphic': BrushNib('calligraphic', self),
 			'hairy': BrushHairy('hairy', self),
+			'round': BrushStamp('round', self, _("Round brush"), \
+			         {'shape': 'round', 'hardness': 0.5, 'spacing': 0.1}),
+			'spray': BrushStamp('spray', self, _("Spray"), \
+			         {'shape': 'spray', 'hardness': 0.0, 'spacing': 0.5}),
+			'bristle': BrushStamp('bristle', self, _("Bristle brush"), \
+			         {'shape': 'bristle', 'hardness': 1.0, 'spacing': 0.1}),
 		}
 
 		self._brush_type = 'simple'
@@ -64,17 +71,31 @@ class ToolBrush(AbstractClassicTool):
 	def on_press_on_area(self, event, surface, event_x, event_y):
 		self.set_common_values(event.button, event_x, event_y)
 		self._manual_path = []
+		self._stroke_points = []
 		self._add_pressured_point(event_x, event_y, event)
 		self._used_pressure = self._manual_path[0]['p'] is not None
 
+		brush = self._brushes_dict[self._brush_type]
+		preview_width = brush.get_incremental_preview_width(self.tool_width)
+		# the other brushes don't report what they damage
+		self.reports_damage = preview_width is not None
+		if preview_width is not None:
+			layers = [(preview_width, self.main_color)]
+			self.start_incremental_stroke(layers, False)
+
 	def on_motion_on_area(self, event, surface, event_x, event_y, render=True):
 		self._add_pressured_point(event_x, event_y, event)
-		if render:
-			operation = self.build_operation()
-			self.do_tool_operation(operation)
+		if not render:
+			return
+		if self._stroke is not None:
+			self.preview_incremental_stroke(self._stroke_points, self._operator)
+			return
+		operation = self.build_operation()
+		self.do_tool_operation(operation)
 
 	def on_release_on_area(self, event, surface, event_x, event_y):
 		self._add_pressured_point(event_x, event_y, event)
+		self.end_incremental_stroke()
 		operation = self.build_operation()
 		operation['is_preview'] = False
 		self.apply_operation(operation)
@@ -88,6 +109,7 @@ class ToolBrush(AbstractClassicTool):
 			'p': self._get_pressure(event)
 		}
 		self._manual_path.append(new_point)
+		self._stroke_points.append((event_x, event_y))
 
 	def _get_pressure(self, event):
 		device = event.get_source_device()
@@ -131,6 +153,11 @@ class ToolBrush(AbstractClassicTool):
 	def do_tool_operation(self, operation):
 		if operation['path'] is None or len(operation['path']) < 1:
 			return
+		# Only the incremental previews report their damages, not the brushes,
+		# so the image is completely restored. It's also the case for the final
+		# stroke of a brush previewed incrementally, and for the replayed
+		# operations, whatever the brush used last.
+		self.reports_damage = False
 		cairo_context = self.start_tool_operation(operation)
 
 		active_brush = self._brushes_dict[operation['brush_id']]
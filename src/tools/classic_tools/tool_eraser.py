@@ -18,6 +18,7 @@
 import cairo
 from gi.repository import Gdk, GdkPixbuf
 from .abstract_classic_tool import AbstractClassicTool
+from .utilities_arrays import utilities_numpy_is_available
 
 from .eraser_area import EraserArea
 from .eraser_color import EraserColor
@@ -34,6 +35,7 @@ class ToolEraser(AbstractClassicTool):
 		self.load_tool_action_enum('eraser-shape', 'last-eraser-type')
 		self.load_tool_action_enum('selection-color', 'last-delete-replace')
 		self.add_tool_action_enum('eraser-type', 'mosaic')
+		self.add_tool_action_boolean('eraser-similar-colors', False)
 		self._rgba = [0.0, 0.0, 0.0, 0.0]
 
 		self._erasers = {
@@ -45,7 +47,8 @@ class ToolEraser(AbstractClassicTool):
 	def get_editing_tips(self):
 		opt = {
 			'selection-color': self._rgba_type,
-			'eraser-type': self._eraser_type
+			'eraser-type': self._eraser_type,
+			'eraser-similar-colors': self._use_similar_colors
 		}
 		label_options = self.label + " - " + self.get_eraser().get_label_options(opt)
 
@@ -83,6 +86,12 @@ class ToolEraser(AbstractClassicTool):
 		use_solid_color = ('solid' == self._eraser_type) and \
 		                                         ('color' != self._eraser_shape)
 		self.set_action_sensitivity('selection-color', use_solid_color)
+		# without numpy, only the exact colors can be removed
+		can_use_similar = utilities_numpy_is_available()
+		self._use_similar_colors = can_use_similar and \
+		                         self.get_option_value('eraser-similar-colors')
+		self.set_action_sensitivity('eraser-similar-colors', \
+		                      can_use_similar and 'color' == self._eraser_shape)
 		if use_solid_color and 'secondary' == self._rgba_type:
 			self._fallback_operator = 'source'
 		else:
@@ -97,6 +106,7 @@ class ToolEraser(AbstractClassicTool):
 
 	def give_back_control(self, should_preserve_selection):
 		self.set_action_sensitivity('selection-color', True)
+		self.set_action_sensitivity('eraser-similar-colors', True)
 
 	def get_eraser(self):
 		return self._erasers[self._eraser_shape]
@@ -128,7 +138,7 @@ class ToolEraser(AbstractClassicTool):
 		self._path = self.get_eraser().on_motion(cairo_context, \
 		           [self.x_press, self.y_press], [event_x, event_y], self._path)
 
-		if not render:
+		if not render or not self.get_eraser().has_live_preview():
 			return
 		operation = self.build_operation(True)
 		self.do_tool_operation(operation)
@@ -161,10 +171,22 @@ class ToolEraser(AbstractClassicTool):
 			'censor-type': eraser_type,
 			'censor-shape': self._eraser_shape,
 			'antialias': self._use_antialias,
-			'path': self._path
+			'path': self._path,
+			'similar-colors': self._use_similar_colors,
+			'bbox': self._get_selection_bbox()
 		}
 		return operation
 
+	def _get_selection_bbox(self):
+		"""The area where the colors can be removed, or None for the whole
+		image."""
+		if not self.selection_is_active():
+			return None
+		selection = self.get_selection()
+		pixbuf = selection.get_pixbuf()
+		return (selection.selection_x, selection.selection_y, \
+		                                 pixbuf.get_width(), pixbuf.get_height())
+
 	def do_tool_operation(self, operation):
 		# depending on the implementation, the "path" might not be a cairo.Path
 		if operation['path'] is None:
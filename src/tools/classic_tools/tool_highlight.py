@@ -18,6 +18,7 @@
 import cairo
 from .tool_pencil import ToolPencil
 from .abstract_classic_tool import AbstractClassicTool
+from .utilities_paths import DrPointsBuffer
 
 class ToolHighlighter(ToolPencil):
 	__gtype_name__ = 'ToolHighlighter'
@@ -28,7 +29,8 @@ class ToolHighlighter(ToolPencil):
 		AbstractClassicTool.__init__(self, 'highlight', _("Highlighter"), \
 		                                      'tool-highlight-symbolic', window)
 		self.use_operator = False
-		self._path = None
+		self.reports_damage = True
+		self._points = DrPointsBuffer()
 		self.add_tool_action_boolean('highlight-alpha', True)
 		self.add_tool_action_boolean('highlight-rigid', True)
 		self.add_tool_action_enum('highlight-bg', 'light')
@@ -63,7 +65,8 @@ class ToolHighlighter(ToolPencil):
 
 	def on_press_on_area(self, event, surface, event_x, event_y):
 		self.set_common_values(event.button, event_x, event_y)
-		self._path = None
+		self._points = DrPointsBuffer()
+		self._points.append(event_x, event_y)
 
 		self.update_modifier_state(event.state)
 		if 'SHIFT' in self._modifier_keys:
@@ -72,32 +75,20 @@ class ToolHighlighter(ToolPencil):
 			else:
 				self._bg_type = 'light'
 
+		main_color = list(self.main_color)
+		if self._force_alpha:
+			main_color[3] = 0.5
+		layers = [(self.tool_width, main_color)]
+		self.start_incremental_stroke(layers, False, True)
+
 	def _add_point(self, event_x, event_y):
-		cairo_context = self.get_context()
-		if self._path is None:
-			cairo_context.move_to(self.x_press, self.y_press)
-		elif self._didnt_really_move(cairo_context, event_x, event_y):
-			length = -1
-			for pts in self._path:
-				if pts[1] == ():
-					continue
-				length += 1
-				# a better technique to find the length probably exists
-			for index, pts in enumerate(self._path):
-				if pts[1] == ():
-					continue
-				if pts[0] == cairo.PathDataType.MOVE_TO:
-					cairo_context.move_to(pts[1][0], pts[1][1])
-				elif index == length:
-					event_x = (pts[1][0] + event_x) / 2
-					event_y = (pts[1][1] + event_y) / 2
-					break
-				else: # if pts[0] == cairo.PathDataType.LINE_TO:
-					cairo_context.line_to(pts[1][0], pts[1][1])
-		cairo_context.line_to(event_x, event_y)
-		self._path = cairo_context.copy_path()
-
-	def _didnt_really_move(self, cairo_context, event_x, event_y):
+		if len(self._points) > 1 and self._didnt_really_move(event_x, event_y):
+			last_x, last_y = self._points.pop()
+			event_x = (last_x + event_x) / 2
+			event_y = (last_y + event_y) / 2
+		self._points.append(event_x, event_y)
+
+	def _didnt_really_move(self, event_x, event_y):
 		"""Tells if the pointer has moved enough to add a new point, otherwise
 		the last point will be changed.
 		It's an option that can be disabled.
@@ -105,28 +96,26 @@ class ToolHighlighter(ToolPencil):
 		assume the underlying text is written horizontally, and in straight
 		lines; so the highlighting will also be straight, but the chosen line
 		may change during the stroke."""
-		cairo_context.append_path(self._path)
 		if not self._is_rigid:
 			return False
 
 		rigidity = min(self.tool_width, 10.0)
-		if abs(cairo_context.get_current_point()[0] - event_x) > rigidity:
+		last_x, last_y = self._points[-1]
+		if abs(last_x - event_x) > rigidity:
 			return False
-		if abs(cairo_context.get_current_point()[1] - event_y) > rigidity / 5:
+		if abs(last_y - event_y) > rigidity / 5:
 			return False
-
-		cairo_context.new_path()
 		return True
 
 	def on_motion_on_area(self, event, surface, event_x, event_y, render=True):
 		self._add_point(event_x, event_y)
 		if not render:
 			return
-		operation = self.build_operation()
-		self.do_tool_operation(operation)
+		self.preview_incremental_stroke(self._points, self._get_operator())
 
 	def on_release_on_area(self, event, surface, event_x, event_y):
 		self._add_point(event_x, event_y)
+		self.end_incremental_stroke()
 		operation = self.build_operation()
 		self.apply_operation(operation)
 
@@ -137,7 +126,7 @@ class ToolHighlighter(ToolPencil):
 			'tool_id': self.id,
 			'rgba': self.main_color,
 			'width': self.tool_width,
-			'path': self._path,
+			'path': self._get_operation_points(),
 			'bg-type': self._bg_type,
 			'halpha': self._force_alpha
 		}
@@ -152,20 +141,25 @@ class ToolHighlighter(ToolPencil):
 		ccontext.set_line_join(cairo.LineJoin.ROUND)
 		ccontext.set_line_width(operation['width'])
 
-		if operation['bg-type'] == 'light':
-			operator = cairo.Operator.MULTIPLY
-		else:
-			operator = cairo.Operator.SCREEN
-		ccontext.set_operator(operator)
+		ccontext.set_operator(self._get_operator(operation['bg-type']))
 
 		main_color = operation['rgba']
 		if operation['halpha']:
 			main_color[3] = 0.5
 		ccontext.set_source_rgba(*main_color)
 
-		ccontext.append_path(operation['path'])
+		operation['path'].add_to_context(ccontext)
+		self.add_damage_from_extents(ccontext.stroke_extents())
 		ccontext.stroke()
 
+	def _get_operator(self, bg_type=None):
+		if bg_type is None:
+			bg_type = self._bg_type
+		if bg_type == 'light':
+			return cairo.Operator.MULTIPLY
+		else:
+			return cairo.Operator.SCREEN
+
 	############################################################################
 ################################################################################
 
@@ -16,18 +16,24 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import cairo
-from gi.repository import Gdk
 from .abstract_classic_tool import AbstractClassicTool
-from .utilities_paths import utilities_get_magic_path
-from .utilities_paths import utilities_get_rgba_for_xy
+from .utilities_arrays import utilities_numpy_is_available
+from .utilities_color_masks import utilities_replace_color
+from .utilities_fill import utilities_flood_fill
+from .utilities_sampling import utilities_get_rgba_for_xy
 
 class ToolPaint(AbstractClassicTool):
 	__gtype_name__ = 'ToolPaint'
 
+	# Maximal difference (for each channel) between the clicked color and the
+	# colors replaced by the 'replace' algorithm
+	REPLACE_TOLERANCE = 10
+
 	def __init__(self, window, **kwargs):
 		# Context: the name of a tool to fill an area of one color with an other
 		super().__init__('paint', _("Paint"), 'tool-paint-symbolic', window)
-		self._magic_path = None
+		self._fill_mask = None
+		self._fill_bbox = None
 		self.use_size = False
 		self.add_tool_action_enum('paint_algo', 'replace')
 
@@ -41,10 +47,9 @@ class ToolPaint(AbstractClassicTool):
 		elif paint_algo == 'whole':
 			return [_("Click on the canvas to entirely paint it")]
 
-		label_warning1 = self.label + " - " + _("May not work for complex shapes")
-		label_warning2 = self.label + " - " + _("It will not work well if " + \
+		label_warning = self.label + " - " + _("It will not work well if " + \
 		                                          "the area's edges are blurry")
-		return [label_warning1, label_warning2]
+		return [label_warning]
 
 	############################################################################
 
@@ -60,11 +65,11 @@ class ToolPaint(AbstractClassicTool):
 		self.old_color = utilities_get_rgba_for_xy(surface, event_x, event_y)
 
 		if self.get_option_value('paint_algo') == 'fill':
-			self._magic_path = utilities_get_magic_path(surface, event_x, \
-			                                            event_y, self.window, 1)
+			self._fill_mask, self._fill_bbox = utilities_flood_fill(surface, \
+			                                               event_x, event_y)
 		elif self.get_option_value('paint_algo') == 'replace':
-			self._magic_path = utilities_get_magic_path(surface, event_x, \
-			                                            event_y, self.window, 2)
+			self._fill_mask, self._fill_bbox = utilities_flood_fill(surface, \
+			                       event_x, event_y, self.REPLACE_TOLERANCE)
 		else:
 			pass # == 'whole'
 
@@ -82,7 +87,8 @@ class ToolPaint(AbstractClassicTool):
 			'new_rgba': self.main_color,
 			'antialias': self._use_antialias,
 			'old_rgba': self.old_color,
-			'path': self._magic_path
+			'mask': self._fill_mask,
+			'bbox': self._fill_bbox
 		}
 		return operation
 
@@ -105,100 +111,31 @@ class ToolPaint(AbstractClassicTool):
 		cairo_context.paint()
 
 	def _op_fill(self, operation):
-		"""Simple but ugly, and it's relying on the precision of the provided
-		path whose creation is based on shitty heurisctics."""
-		if operation['path'] is None:
+		"""Paint the area found by the flood-fill over its current pixels."""
+		if operation['mask'] is None:
 			return
 		cairo_context = self.get_context()
 		cairo_context.set_source_rgba(*operation['new_rgba'])
-		cairo_context.append_path(operation['path'])
-		# can_fill = cairo_context.in_fill(operation['x'], operation['y'])
-		# print(can_fill)
-		# if not can_fill:
-		# 	cairo_context.set_fill_rule(cairo.FillRule.EVEN_ODD)
-		# 	XXX doesn't work as i expected
-		cairo_context.fill()
+		bbox = operation['bbox']
+		cairo_context.mask_surface(operation['mask'], bbox[0], bbox[1])
 
 	def _op_replace(self, operation):
-		"""Algorithmically less ugly than `_op_fill`, but the replacing strategy
-		itself doesn't handle (semi-) transparent colors correctly. Looks fine
-		when there is no alpha at all and the anti-aliasing is off."""
-		# In this example, the user paints in blue and clicks on X (red):
-		#
-		# rrrrrrrrrrrrrrrrrrrrrrrrr
-		# rrrgggggggggggggggggrrXrr
-		# rrrgaaaaaaaaaaaaaaagrrrrr
-		# rrrgaaaaaaaaaaaaaaagrrrrr
-		# rrrgggggggggggggggggrraaa
-		# rrrrrrrrrrrrrrrrrrrrrraaa
-		#
-		# All red pixels will be painted blue, but FIXME all the green ones too.
-		if operation['path'] is None:
+		"""Replace the pixels of the area found by the flood-fill (with some
+		tolerance) by the new color, including their alpha channel, in one pass
+		on the data of the surface. Without numpy, the area is painted with the
+		new color at once instead, without keeping the antialiasing."""
+		if operation['mask'] is None:
 			return
-
-		# First, everything BUT the targeted area is erased
-		surface = self.get_surface()
-		cairo_context = cairo.Context(surface)
-		old_rgba = operation['old_rgba']
-		cairo_context.set_source_rgba(255, 255, 255, 1.0)
-		cairo_context.append_path(operation['path'])
-		cairo_context.set_operator(cairo.Operator.DEST_IN)
-		cairo_context.set_line_width(4) # ptêt too much mdr
-		cairo_context.set_antialias(cairo.Antialias.NONE)
-		cairo_context.stroke_preserve()
-		# cairo_context.fill_preserve()
-
-		# The result is loaded as the temp pixbuf…
-		self.get_image().set_temp_pixbuf(Gdk.pixbuf_get_from_surface(surface, \
-		                       0, 0, surface.get_width(), surface.get_height()))
-		# …where the targeted color is replaced by pure alpha
-		TOLERANCE = 10 # XXX uuugly
-		i = -1 * TOLERANCE
-		while i < TOLERANCE:
-			red = max(0, old_rgba[0]+i)
-			green = max(0, old_rgba[1]+i)
-			blue = max(0, old_rgba[2]+i)
-			red = int(min(255, red))
-			green = int(min(255, green))
-			blue = int(min(255, blue))
-			self._replace_temp_with_alpha(red, green, blue)
-			i = i+1
-
-		# The main pixbuf is restored, since its alterations were a side effect
-		# of this highly stupid algorithm
-		self.restore_pixbuf()
-		# We get a context from it again
-		cairo_context2 = self.get_context()
-
-		# The content of the path is cleared
-		cairo_context2.append_path(operation['path'])
-		cairo_context2.set_operator(cairo.Operator.CLEAR)
-		cairo_context2.set_source_rgba(255, 255, 255, 1.0)
-		cairo_context2.set_line_width(3) # ptêt too much mdr
-		cairo_context.set_antialias(cairo.Antialias.NONE)
-		cairo_context2.stroke_preserve()
-		cairo_context2.fill()
-
-		# The temp pixbuf (where "only" the pixels around the outline which are
-		# not in the targeted color still exist) is shown on top of the image
-		cairo_context2.set_operator(cairo.Operator.OVER)
-		Gdk.cairo_set_source_pixbuf(cairo_context2, \
-		                                     self.get_image().temp_pixbuf, 0, 0)
-		cairo_context2.paint()
-		self.non_destructive_show_modif()
-
-		# The transparent pixels within the path are painted with the new color
-		cairo_context2.set_operator(cairo.Operator.DEST_OVER)
-		cairo_context2.set_source_rgba(*operation['new_rgba'])
-		cairo_context2.append_path(operation['path'])
-		# cairo_context2.paint()
-		cairo_context2.set_line_width(3) # ptêt too much mdr
-		cairo_context2.stroke_preserve()
-		cairo_context2.fill()
-
-	def _replace_temp_with_alpha(self, red, green, blue):
-		new_pixbuf = self.get_image().temp_pixbuf.add_alpha(True, red, green, blue)
-		self.get_image().set_temp_pixbuf(new_pixbuf)
+		if utilities_numpy_is_available():
+			utilities_replace_color(self.get_surface(), operation['old_rgba'], \
+			                  operation['new_rgba'], self.REPLACE_TOLERANCE, \
+			                  bbox=operation['bbox'], mask=operation['mask'])
+			return
+		cairo_context = self.get_context()
+		cairo_context.set_operator(cairo.Operator.SOURCE)
+		cairo_context.set_source_rgba(*operation['new_rgba'])
+		bbox = operation['bbox']
+		cairo_context.mask_surface(operation['mask'], bbox[0], bbox[1])
 
 	############################################################################
 ################################################################################
@@ -17,7 +17,7 @@
 
 import cairo, math
 from .abstract_classic_tool import AbstractClassicTool
-from .utilities_paths import utilities_smooth_path
+from .utilities_paths import utilities_smooth_points, DrPointsBuffer
 
 class ToolPencil(AbstractClassicTool):
 	__gtype_name__ = 'ToolPencil'
@@ -25,8 +25,9 @@ class ToolPencil(AbstractClassicTool):
 	def __init__(self, window, **kwargs):
 		super().__init__('pencil', _("Pencil"), 'tool-pencil-symbolic', window)
 		self.use_operator = True
+		self.reports_damage = True
 
-		self._path = None
+		self._points = DrPointsBuffer()
 		self._shape_label = _("Round")
 		self._cap_id = cairo.LineCap.ROUND
 		self._join_id = cairo.LineCap.ROUND
@@ -79,25 +80,41 @@ class ToolPencil(AbstractClassicTool):
 
 	def on_press_on_area(self, event, surface, event_x, event_y):
 		self.set_common_values(event.button, event_x, event_y)
-		self._path = None
+		self._points = DrPointsBuffer()
+		self._points.append(event_x, event_y)
 
 		self.update_modifier_state(event.state)
 		if 'ALT' in self._modifier_keys:
 			self._use_outline = not self._use_outline
 
+		# dashes and angular joins can't be previewed segment by segment
+		if self._dashes_type == 'none' and self._join_id == cairo.LineJoin.ROUND:
+			self.start_incremental_stroke(self._get_stroke_layers(), \
+			                     not self.get_image().is_zoomed_surface_sharp())
+
+	def _get_stroke_layers(self):
+		layers = []
+		if self._use_outline:
+			layers.append((self.tool_width * 1.2 + 2, self.secondary_color))
+		layers.append((self.tool_width, self.main_color))
+		return layers
+
 	def _add_point(self, event_x, event_y):
-		cairo_context = self.get_context()
-		if self._path is None:
-			cairo_context.move_to(self.x_press, self.y_press)
-		else:
-			cairo_context.append_path(self._path)
-		cairo_context.line_to(event_x, event_y)
-		self._path = cairo_context.copy_path()
+		self._points.append(event_x, event_y)
+
+	def _get_operation_points(self):
+		# a new buffer is created for each stroke, so it can be used as is
+		if len(self._points) < 2:
+			return None
+		return self._points
 
 	def on_motion_on_area(self, event, surface, event_x, event_y, render=True):
 		self._add_point(event_x, event_y)
 		if not render:
 			return
+		if self._stroke is not None:
+			self.preview_incremental_stroke(self._points, self._operator)
+			return
 		operation = self.build_operation()
 		self.do_tool_operation(operation)
 
@@ -120,6 +137,7 @@ class ToolPencil(AbstractClassicTool):
 				delta_y = -0.20
 			self._add_point(event_x + delta_x, event_y + delta_y)
 
+		self.end_incremental_stroke()
 		operation = self.build_operation()
 		self.apply_operation(operation)
 
@@ -138,7 +156,7 @@ class ToolPencil(AbstractClassicTool):
 			'line_cap': self._cap_id,
 			'line_join': self._join_id,
 			'dashes': self._dashes_type,
-			'path': self._path
+			'path': self._get_operation_points()
 		}
 		return operation
 
@@ -154,17 +172,20 @@ class ToolPencil(AbstractClassicTool):
 		cairo_context.set_line_join(operation['line_join']) # XXX useless?
 
 		if operation['smooth']:
-			utilities_smooth_path(cairo_context, operation['path'])
+			utilities_smooth_points(cairo_context, operation['path'])
 		else:
-			cairo_context.append_path(operation['path'])
+			operation['path'].add_to_context(cairo_context)
 
 		if operation['outline']:
 			cairo_context.set_source_rgba(*operation['rgba2'])
 			cairo_context.set_line_width(line_width * 1.2 + 2)
+			self.add_damage_from_extents(cairo_context.stroke_extents())
 			cairo_context.stroke_preserve()
 
 		cairo_context.set_source_rgba(*operation['rgba'])
 		cairo_context.set_line_width(line_width)
+		if not operation['outline']:
+			self.add_damage_from_extents(cairo_context.stroke_extents())
 		cairo_context.stroke()
 
 	############################################################################
@@ -17,7 +17,8 @@
 
 import cairo, math
 from .abstract_classic_tool import AbstractClassicTool
-from .utilities_paths import utilities_smooth_path
+from .utilities_paths import utilities_smooth_path, \
+                             utilities_smooth_points, DrPointsBuffer
 
 class ToolShape(AbstractClassicTool):
 	__gtype_name__ = 'ToolShape'
@@ -221,23 +222,24 @@ class ToolShape(AbstractClassicTool):
 		self.on_release_on_area(None, None, self.initial_x, self.initial_y)
 
 	def _add_point(self, event_x, event_y, memorize):
-		"""Add a point to a shape (used by both freeshape and polygon)."""
-		cairo_context = self.get_context()
+		"""Add a point to a shape (used by both freeshape and polygon). The
+		points are stored in a `DrPointsBuffer`, which is only copied when the
+		point isn't memorized."""
 		if self.initial_x is None:
 			# print('init polygon')
 			(self.initial_x, self.initial_y) = (self.x_press, self.y_press)
-			cairo_context.move_to(self.x_press, self.y_press)
-			self._path = cairo_context.copy_path()
-		else:
-			cairo_context.append_path(self._path)
+			self._path = DrPointsBuffer()
+			self._path.append(self.x_press, self.y_press)
 		should_close = self._should_close_shape(event_x, event_y)
-		if not should_close:
-			# print('continue polygon')
-			cairo_context.line_to(event_x, event_y)
 		if memorize:
 			# print('memorize polygon')
-			self._path = cairo_context.copy_path()
-		operation = self.build_operation(cairo_context.copy_path())
+			points = self._path
+		else:
+			points = self._path.copy()
+		if not should_close:
+			# print('continue polygon')
+			points.append(event_x, event_y)
+		operation = self.build_operation(points)
 		operation['closed'] = should_close
 		return operation
 
@@ -356,10 +358,16 @@ class ToolShape(AbstractClassicTool):
 		cairo_context.set_line_width(line_width)
 		cairo_context.set_line_join(operation['line_join'])
 
-		if operation['smooth']:
-			utilities_smooth_path(cairo_context, operation['path'])
+		path = operation['path']
+		if isinstance(path, DrPointsBuffer):
+			if operation['smooth']:
+				utilities_smooth_points(cairo_context, path)
+			else:
+				path.add_to_context(cairo_context)
+		elif operation['smooth']:
+			utilities_smooth_path(cairo_context, path)
 		else:
-			cairo_context.append_path(operation['path'])
+			cairo_context.append_path(path)
 		if operation['closed']:
 			cairo_context.close_path()
 
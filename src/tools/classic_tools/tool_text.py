@@ -234,7 +234,7 @@ class ToolText(AbstractClassicTool):
 			operation = self.build_operation()
 			self.do_tool_operation(operation)
 
-	def on_draw_above(self, area, ccontext):
+	def on_draw_above(self, area, ccontext, visible_rect=None):
 		if not self._has_current_text():
 			return
 
@@ -162,12 +162,13 @@ class AbstractSelectionTool(AbstractAbstractTool):
 		elif self.behavior == 'drag':
 			self._apply_drag_to(event_x, event_y)
 
-	def on_draw_above(self, area, ccontext):
+	def on_draw_above(self, area, ccontext, visible_rect):
 		if not self.selection_is_active():
 			return
 		ldx = self.local_dx
 		ldy = self.local_dy
-		self.get_selection().show_selection_on_surface(ccontext, True, ldx, ldy)
+		self.get_selection().show_selection_on_surface(ccontext, True, \
+		                                               ldx, ldy, visible_rect)
 		dragged_path = self.get_selection().get_path_with_scroll(ldx, ldy)
 		# ^ Method not really use elsewhere, could it be private?
 		thickness = self.get_overlay_thickness()
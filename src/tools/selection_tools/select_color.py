@@ -15,11 +15,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import cairo
 from .abstract_select import AbstractSelectionTool
 from .utilities_colors import utilities_get_rgba_name, \
                               utilities_gdk_rgba_from_xy, \
                               utilities_gdk_rgba_to_hexadecimal
-from .utilities_paths import utilities_get_magic_path
+from .utilities_fill import utilities_flood_fill, utilities_path_from_mask
 
 class ToolColorSelect(AbstractSelectionTool):
 	__gtype_name__ = 'ToolColorSelect'
@@ -41,11 +42,9 @@ class ToolColorSelect(AbstractSelectionTool):
 	def get_editing_tips(self):
 		tips = super().get_editing_tips()
 		if not self.selection_is_active():
-			label_warning1 = self.label + " - " + _("May not work for complex shapes")
-			tips.append(label_warning1)
-			label_warning2 = self.label + " - " + _("It will not work well " + \
+			label_warning = self.label + " - " + _("It will not work well " + \
 				                               "if the area's edges are blurry")
-			tips.append(label_warning2)
+			tips.append(label_warning)
 		return tips
 
 	############################################################################
@@ -57,7 +56,11 @@ class ToolColorSelect(AbstractSelectionTool):
 		pass
 
 	def release_define(self, surfc, event_x, event_y):
-		path = utilities_get_magic_path(surfc, event_x, event_y, self.window, 1)
+		mask, bbox = utilities_flood_fill(surfc, event_x, event_y)
+		if mask is None:
+			path = None
+		else:
+			path = utilities_path_from_mask(cairo.Context(surfc), mask, bbox)
 		self._pre_load_path(path)
 		if path is None:
 			return
@@ -17,6 +17,7 @@
 
 import cairo
 from .abstract_select import AbstractSelectionTool
+from .utilities_paths import DrPointsBuffer
 
 class ToolFreeSelect(AbstractSelectionTool):
 	__gtype_name__ = 'ToolFreeSelect'
@@ -28,6 +29,7 @@ class ToolFreeSelect(AbstractSelectionTool):
 		self.closing_precision = 10
 		self.closing_x = 0.0
 		self.closing_y = 0.0
+		self._points = None
 		self.add_tool_action_simple('selection_close', self._force_close_shape)
 		self.set_action_sensitivity('selection_close', False)
 
@@ -76,24 +78,30 @@ class ToolFreeSelect(AbstractSelectionTool):
 		thickness = self.get_overlay_thickness()
 		cairo_context.set_dash([3 * thickness, 3 * thickness])
 		cairo_context.set_line_width(thickness)
-		if self.get_selection().get_future_path() is None:
+		future_path = self.get_selection().get_future_path()
+		if future_path is None or self._points is None:
 			self.closing_x = event_x
 			self.closing_y = event_y
+			# The points are stored in a buffer while the shape is defined, the
+			# cairo path given to the selection is only updated when it's closed
+			self._points = DrPointsBuffer()
+			self._points.append(event_x, event_y)
 			cairo_context.move_to(event_x, event_y)
 			self._pre_load_path(cairo_context.copy_path())
 			return False
 		delta_x = max(event_x, self.closing_x) - min(event_x, self.closing_x)
 		delta_y = max(event_y, self.closing_y) - min(event_y, self.closing_y)
-		cairo_context.append_path(self.get_selection().get_future_path())
+		self._points.add_to_context(cairo_context)
 		if (delta_x < self.closing_precision) and (delta_y < self.closing_precision):
 			cairo_context.close_path()
 			cairo_context.stroke_preserve()
 			self._pre_load_path(cairo_context.copy_path())
+			self._points = None
 			return True
 		else:
 			cairo_context.line_to(event_x, event_y)
-			cairo_context.stroke_preserve() # draw the line without closing the path
-			self._pre_load_path(cairo_context.copy_path())
+			cairo_context.stroke() # draw the line without closing the path
+			self._points.append(event_x, event_y)
 			if render:
 				self.non_destructive_show_modif()
 			return False
@@ -15,10 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import cairo
+import cairo, math
 from gi.repository import Gtk, Gdk, GdkPixbuf
 
 from .abstract_tool import AbstractAbstractTool
+from .utilities_worker import DrWorker
 
 class AbstractCanvasTool(AbstractAbstractTool):
 	__gtype_name__ = 'AbstractCanvasTool'
@@ -38,9 +39,17 @@ class AbstractCanvasTool(AbstractAbstractTool):
 		# ugly ass lock so the 'cancel' button does actually cancel
 		self._auto_apply_next = True
 
+		# (source pixbuf, scale, downscaled copy) used to preview operations
+		self._preview_proxy = None
+
+		# computes the previews in a background thread
+		self._worker = DrWorker()
+
 	def on_tool_selected(self, *args):
 		super().on_tool_selected()
 		self.apply_to_selection = self.selection_is_active()
+		self._preview_proxy = None
+		self._worker.cancel()
 
 	def update_actions_state(self, *args):
 		# Changing this in on_tool_selected would be overridden by image.py
@@ -55,6 +64,7 @@ class AbstractCanvasTool(AbstractAbstractTool):
 		self.set_action_sensitivity('apply_transform', True)
 
 	def give_back_control(self, preserve_selection=True):
+		self._worker.cancel()
 		if not preserve_selection and self.selection_is_active():
 			self.window.get_selection_tool().unselect_and_apply()
 		super().give_back_control(preserve_selection)
@@ -84,21 +94,71 @@ class AbstractCanvasTool(AbstractAbstractTool):
 		operation = self.build_operation()
 		self.do_tool_operation(operation)
 
+	def run_transform(self, operation, function, source_pixbuf):
+		"""Compute the result of `operation` with `function(operation, pixbuf,
+		full_size)`, where `pixbuf` is given by `get_operation_source` and
+		`full_size` is the size of `source_pixbuf`. It returns the new pixbuf
+		and the size it would have at full resolution, and the new pixbuf is
+		set as the temp pixbuf. Previews are computed in a background thread,
+		so `function` can't use GTK nor the state of the tool, and they're
+		shown once they're ready, unless an other operation has been started
+		meanwhile. Applied operations are computed at once."""
+		pixbuf = self.get_operation_source(source_pixbuf, operation)
+		full_size = (source_pixbuf.get_width(), source_pixbuf.get_height())
+		args = (operation, pixbuf, full_size)
+		if not operation['is_preview']:
+			self._worker.cancel()
+			self._end_transform(operation, function(*args))
+			return
+		callback = lambda result: self._end_transform(operation, result)
+		self._worker.submit(function, args, callback, \
+		                                      lambda e: self.show_error(str(e)))
+
+	def _end_transform(self, operation, result):
+		new_pixbuf, size = result
+		self.get_image().set_temp_pixbuf(new_pixbuf, size)
+		self.common_end_operation(operation)
+
+	def get_operation_source(self, source_pixbuf, operation):
+		"""Return the pixbuf an operation should transform: `source_pixbuf`
+		itself to apply it, or a downscaled copy to preview it if the image is
+		zoomed out, since the preview doesn't have to be more detailed than
+		the canvas. The copy is cached as long as the source pixbuf and the
+		zoom level don't change. The size the result would have at full
+		resolution should be given to the `set_temp_pixbuf` method of the
+		image. It's called on the main thread, before the worker starts."""
+		zoom = self.get_image().zoom_level
+		if not operation['is_preview'] or zoom >= 1.0:
+			return source_pixbuf
+		# same scales as the mipmaps of the image, so the copy stays the same
+		# when the zoom level changes a little
+		scale = 1 / (2 ** math.floor(math.log2(1 / zoom)))
+		if scale >= 1.0:
+			return source_pixbuf
+
+		if self._preview_proxy is not None:
+			cached_source, cached_scale, proxy = self._preview_proxy
+			if cached_source is source_pixbuf and cached_scale == scale:
+				return proxy
+		width = max(1, round(source_pixbuf.get_width() * scale))
+		height = max(1, round(source_pixbuf.get_height() * scale))
+		proxy = source_pixbuf.scale_simple(width, height, \
+		                                          GdkPixbuf.InterpType.BILINEAR)
+		self._preview_proxy = (source_pixbuf, scale, proxy)
+		return proxy
+
 	def temp_preview(self, is_selection, local_dx, local_dy):
 		"""Part of the previewing methods shared by all transform tools."""
-		pixbuf = self.get_image().temp_pixbuf
 		cairo_context = self.get_context()
 		if is_selection:
 			cairo_context.set_source_surface(self.get_surface(), 0, 0)
 			cairo_context.paint()
 			x = self.get_selection().selection_x + local_dx
 			y = self.get_selection().selection_y + local_dy
-			Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, x, y)
-			cairo_context.paint()
+			self._draw_temp_pixbuf(cairo_context, x, y, None)
 		else:
 			cairo_context.set_operator(cairo.Operator.SOURCE)
-			Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, 0, 0)
-			cairo_context.paint()
+			self._draw_temp_pixbuf(cairo_context, 0, 0, None)
 			cairo_context.set_operator(cairo.Operator.OVER)
 		self.get_image().update()
 
@@ -119,6 +179,7 @@ class AbstractCanvasTool(AbstractAbstractTool):
 		operation['is_preview'] = False
 		super().apply_operation(operation)
 		self.get_image().reset_temp()
+		self._preview_proxy = None
 
 	def common_end_operation(self, op):
 		if op['is_preview']:
@@ -188,43 +249,37 @@ class AbstractCanvasTool(AbstractAbstractTool):
 
 	############################################################################
 
-	def on_draw_above(self, area, cairo_context):
+	def on_draw_above(self, area, cairo_context, visible_rect):
 		pass
 
-	def _draw_temp_pixbuf(self, cairo_context, x, y):
-		pixbuf = self.get_image().temp_pixbuf
-		Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, x, y)
-		if self.get_image().is_zoomed_surface_sharp():
-			cairo_context.get_source().set_filter(cairo.FILTER_NEAREST)
-		cairo_context.paint()
-
-	def get_resized_surface(self, source_surface, coefs):
-		"""Generate a blank new surface whose size is enough to fit a cairo
-		matrix transformation of `source_surface` using the coefficients in
-		`coefs`. The method `get_deformed_surface` should be used next."""
-		p_xx, p_yx, p_xy, p_yy, p_x0, p_y0 = coefs
-		source_w = source_surface.get_width()
-		source_h = source_surface.get_height()
-		w = p_xx * source_w + p_xy * source_h + p_x0 * 2
-		h = p_yx * source_w + p_yy * source_h + p_y0 * 2
-		return cairo.ImageSurface(cairo.Format.ARGB32, int(w), int(h))
-
-	def get_deformed_surface(self, source_surface, new_surface, coefs):
-		"""Use cairo.Matrix to apply a transformation to `source_surface` using
-		the coefficients in `coefs` and return a new surface with the result."""
-		p_xx, p_yx, p_xy, p_yy, p_x0, p_y0 = coefs
-		cairo_context = cairo.Context(new_surface)
-
-		# m = cairo.Matrix(xx=1.0, yx=0.0, xy=0.0, yy=1.0, x0=0.0, y0=0.0)
-		m = cairo.Matrix(xx=p_xx, yx=p_yx, xy=p_xy, yy=p_yy, x0=p_x0, y0=p_y0)
-		try:
-			cairo_context.transform(m)
-		except:
-			self.show_error(_("Error: invalid values"))
-			return source_surface
-		cairo_context.set_source_surface(source_surface, 0, 0)
-		cairo_context.paint()
-		return new_surface
+	def _draw_temp_pixbuf(self, cairo_context, x, y, visible_rect):
+		"""Paint the temp pixbuf at (x, y), scaled to its actual size if it's
+		a preview at a reduced resolution."""
+		image = self.get_image()
+		pixbuf = image.temp_pixbuf
+		width, height = image.get_temp_size()
+		scale_x = pixbuf.get_width() / width
+		scale_y = pixbuf.get_height() / height
+		if scale_x == 1.0 and scale_y == 1.0:
+			image.paint_pixbuf_part(cairo_context, pixbuf, x, y, visible_rect)
+			return
+
+		cairo_context.save()
+		cairo_context.translate(x, y)
+		cairo_context.scale(1 / scale_x, 1 / scale_y)
+		if visible_rect is not None:
+			rect_x, rect_y, rect_width, rect_height = visible_rect
+			visible_rect = ((rect_x - x) * scale_x, (rect_y - y) * scale_y, \
+			                       rect_width * scale_x, rect_height * scale_y)
+		image.paint_pixbuf_part(cairo_context, pixbuf, 0, 0, visible_rect)
+		cairo_context.restore()
+
+	def get_transform_filter(self, operation):
+		"""Id of the filter used to resample the pixels for `operation`, see
+		`DrAffineTransform`: previews use a faster one."""
+		if operation['is_preview']:
+			return 'bilinear'
+		return 'good'
 
 	############################################################################
 	# Options ##################################################################
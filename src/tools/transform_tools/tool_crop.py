@@ -214,7 +214,7 @@ class ToolCrop(AbstractCanvasTool):
 
 	############################################################################
 
-	def on_draw_above(self, area, cairo_context):
+	def on_draw_above(self, area, cairo_context, visible_rect):
 		if self.apply_to_selection:
 			x1 = int(self._x)
 			y1 = int(self._y)
@@ -226,7 +226,7 @@ class ToolCrop(AbstractCanvasTool):
 		x1, x2, y1, y2 = self.get_image().get_corrected_coords(x1, x2, y1, y2, \
 		                                         self.apply_to_selection, False)
 		if not self.apply_to_selection:
-			self._draw_temp_pixbuf(cairo_context, x1, y1)
+			self._draw_temp_pixbuf(cairo_context, x1, y1, visible_rect)
 		thickness = self.get_overlay_thickness()
 		utilities_show_handles_on_context(cairo_context, x1, x2, y1, y2, thickness)
 
@@ -290,14 +290,35 @@ class ToolCrop(AbstractCanvasTool):
 			source_pixbuf = self.get_selection_pixbuf()
 		else:
 			source_pixbuf = self.get_main_pixbuf()
-		self.get_image().set_temp_pixbuf(source_pixbuf.copy())
-		self._crop_temp_pixbuf(x, y, width, height, is_selection, hexa_rgba)
+		is_pure_crop = self._is_pure_crop(source_pixbuf, x, y, width, \
+		                                                height, is_selection)
+		if operation['is_preview'] and is_pure_crop:
+			# The preview shares the pixels of the source pixbuf, which isn't
+			# modified while previewing. A copy is made when the operation is
+			# applied, because the source will change.
+			new_pixbuf = source_pixbuf.new_subpixbuf(max(x, 0), max(y, 0), \
+			                                                      width, height)
+			self.get_image().set_temp_pixbuf(new_pixbuf)
+		else:
+			self.get_image().set_temp_pixbuf(source_pixbuf)
+			self._crop_temp_pixbuf(x, y, width, height, is_selection, hexa_rgba)
 		if operation['is_etf']:
 			# Case of an "expand to fit" action
 			s_pixbuf = self.get_selection_pixbuf()
 			self.get_selection().update_from_transform_tool(s_pixbuf, -1 * x, -1 * y)
 		self.common_end_operation(operation)
 
+	def _is_pure_crop(self, source_pixbuf, x, y, width, height, is_selection):
+		"""Tells whether the area to keep is entirely inside the source pixbuf,
+		in which case nothing has to be painted with the expansion color."""
+		if not is_selection and (x < 0 or y < 0):
+			return False
+		src_x = max(x, 0)
+		src_y = max(y, 0)
+		return width > 0 and height > 0 \
+		                  and src_x + width <= source_pixbuf.get_width() \
+		                  and src_y + height <= source_pixbuf.get_height()
+
 	def _crop_temp_pixbuf(self, x, y, width, height, is_selection, hexa_rgba):
 		"""Crop and/or expand the temp pixbuf according to given parameters."""
 
@@ -16,6 +16,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import cairo
+from collections import OrderedDict
 from gi.repository import Gdk, GdkPixbuf, Gio, GLib
 from .abstract_transform_tool import AbstractCanvasTool
 from .filter_blur import FilterBlur
@@ -28,6 +29,10 @@ from .filter_veil import FilterVeil
 from .optionsbar_filters import OptionsBarFilters
 from .utilities_blur import utilities_blur_surface, BlurType, BlurDirection
 
+# Maximal size (in bytes) of the filtered pixbufs kept in memory, so previewing
+# the same values again doesn't compute the filter again
+PREVIEWS_CACHE_BUDGET = 128 * 1024 * 1024
+
 class ToolFilters(AbstractCanvasTool):
 	__gtype_name__ = 'ToolFilters'
 
@@ -54,6 +59,12 @@ class ToolFilters(AbstractCanvasTool):
 			'veil': FilterVeil('veil', self),
 		}
 
+		# Filtered pixbufs, by parameters of the operation, from the least to
+		# the most recently used. They're all computed from `_cache_source`.
+		self._previews_cache = OrderedDict()
+		self._cache_source = None
+		self._cache_bytes = 0
+
 	def try_build_pane(self):
 		self.pane_id = 'filters'
 		self.window.options_manager.try_add_bottom_pane(self.pane_id, self)
@@ -91,17 +102,21 @@ class ToolFilters(AbstractCanvasTool):
 
 		self.blur_algo = BlurType.INVALID
 		if state_as_string == 'blur_fast':
-			self.blur_algo = BlurType.CAIRO_REPAINTS
+			self.blur_algo = BlurType.GAUSSIAN
 			self.type_label =  _("Fast blur")
 			self._active_filter = 'blur'
 		elif state_as_string == 'blur_slow':
-			self.blur_algo = BlurType.PX_BOX
+			self.blur_algo = BlurType.AUTO
 			self.type_label = _("Slow blur")
 			self._active_filter = 'blur'
 		elif state_as_string == 'tiles':
 			self.blur_algo = BlurType.TILES
 			self.type_label = _("Mosaic")
 			self._active_filter = 'blur'
+		elif state_as_string == 'tiles_average':
+			self.blur_algo = BlurType.TILES_AVERAGE
+			self.type_label = _("Mosaic (average colors)")
+			self._active_filter = 'blur'
 
 		elif state_as_string == 'saturation':
 			self.type_label = _("Change saturation")
@@ -147,6 +162,10 @@ class ToolFilters(AbstractCanvasTool):
 			# the user explicitly clicks on the canvas to preview
 			self.do_tool_operation(operation)
 
+	def on_tool_unselected(self, *args):
+		super().on_tool_unselected()
+		self._clear_cache(None)
+
 	def _async_open_menu(self, *args):
 		"""This is used as a GSourceFunc so it should return False."""
 		self.bar.menu_btn.set_active(True)
@@ -181,11 +200,50 @@ class ToolFilters(AbstractCanvasTool):
 		else:
 			source_pixbuf = self.get_main_pixbuf()
 
-		active_filter = self._all_filters[operation['filter_id']]
-		active_filter.do_filter_operation(source_pixbuf, operation)
+		if source_pixbuf is not self._cache_source:
+			# the image or the selection changed
+			self._clear_cache(source_pixbuf)
+		key = self._get_cache_key(operation)
+		if key in self._previews_cache:
+			self._previews_cache.move_to_end(key)
+			self.get_image().set_temp_pixbuf(self._previews_cache[key])
+		else:
+			active_filter = self._all_filters[operation['filter_id']]
+			previous_pixbuf = self.get_image().temp_pixbuf
+			active_filter.do_filter_operation(source_pixbuf, operation)
+			if self.get_image().temp_pixbuf is not previous_pixbuf:
+				self._add_to_cache(key, self.get_image().temp_pixbuf)
 
 		self.common_end_operation(operation)
 
 	############################################################################
+	# Cache of the previews ####################################################
+
+	def _get_cache_key(self, operation):
+		"""The parameters of the operation which change its result. Applying
+		the operation uses the same key as previewing it."""
+		params = [(k, v) for k, v in operation.items() if k != 'is_preview']
+		return tuple(sorted(params, key=lambda param: param[0]))
+
+	def _add_to_cache(self, key, pixbuf):
+		"""The filtered pixbufs aren't modified afterwards (applying the
+		operation copies the temp pixbuf), so they can be shared with the
+		image."""
+		nb_bytes = pixbuf.get_rowstride() * pixbuf.get_height()
+		if nb_bytes > PREVIEWS_CACHE_BUDGET:
+			return
+		self._previews_cache[key] = pixbuf
+		self._cache_bytes += nb_bytes
+		while self._cache_bytes > PREVIEWS_CACHE_BUDGET:
+			key, old_pixbuf = self._previews_cache.popitem(last=False)
+			nb_bytes = old_pixbuf.get_rowstride() * old_pixbuf.get_height()
+			self._cache_bytes -= nb_bytes
+
+	def _clear_cache(self, source_pixbuf):
+		self._previews_cache.clear()
+		self._cache_source = source_pixbuf
+		self._cache_bytes = 0
+
+	############################################################################
 ################################################################################
 
@@ -16,9 +16,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import math
-from gi.repository import Gdk
 from .abstract_transform_tool import AbstractCanvasTool
 from .optionsbar_rotate import OptionsBarRotate
+from .utilities_transform import DrAffineTransform
 
 class ToolRotate(AbstractCanvasTool):
 	__gtype_name__ = 'ToolRotate'
@@ -147,14 +147,15 @@ class ToolRotate(AbstractCanvasTool):
 
 	############################################################################
 
-	def on_draw_above(self, area, cairo_context):
+	def on_draw_above(self, area, cairo_context, visible_rect):
 		x1 = 0
 		y1 = 0
-		x2 = x1 + self.get_image().temp_pixbuf.get_width()
-		y2 = y1 + self.get_image().temp_pixbuf.get_height()
+		width, height = self.get_image().get_temp_size()
+		x2 = x1 + width
+		y2 = y1 + height
 		x1, x2, y1, y2 = self.get_image().get_corrected_coords(x1, x2, y1, y2, \
 		                                         self.apply_to_selection, False)
-		self._draw_temp_pixbuf(cairo_context, x1, y1)
+		self._draw_temp_pixbuf(cairo_context, x1, y1, visible_rect)
 
 	############################################################################
 
@@ -173,61 +174,26 @@ class ToolRotate(AbstractCanvasTool):
 
 	def do_tool_operation(self, operation):
 		self.start_tool_operation(operation)
-		angle = operation['angle']
-		flip_h = operation['flip_h']
-		flip_v = operation['flip_v']
 		if operation['is_selection']:
 			source_pixbuf = self.get_selection_pixbuf()
 		else:
 			source_pixbuf = self.get_main_pixbuf()
+		self.run_transform(operation, self._rotate_pixbuf, source_pixbuf)
 
-		if angle < 0:
-			angle += 360
-		gdk_rotation = int(angle / 90) * 90
-		cairo_rotation = angle % 90
-		# print('angle:', angle)
-		# print('gdk_rotation:', gdk_rotation)
-		# print('cairo_rotation:', cairo_rotation)
-		new_pixbuf = source_pixbuf
-
+	def _rotate_pixbuf(self, operation, pixbuf, full_size):
+		transform = DrAffineTransform()
 		# Image flipping (horizontal or vertical "mirroring")
-		if flip_h:
-			new_pixbuf = new_pixbuf.flip(True)
-		if flip_v:
-			new_pixbuf = new_pixbuf.flip(False)
-
-		# Image rotation, using the method from GdkPixbuf.Pixbuf
-		new_pixbuf = new_pixbuf.rotate_simple(gdk_rotation)
-
-		# Image rotation, using methods from cairo.Context (only if needed)
-		if cairo_rotation != 0:
-			surface0 = Gdk.cairo_surface_create_from_pixbuf(new_pixbuf, 0, None)
-			surface0.set_device_scale(self.scale_factor(), self.scale_factor())
-			coefs = self._get_rotation_matrix(cairo_rotation, \
-			                        surface0.get_width(), surface0.get_height())
-			new_surface = self.get_resized_surface(surface0, coefs)
-			new_surface = self.get_deformed_surface(surface0, new_surface, coefs)
-			new_pixbuf = Gdk.pixbuf_get_from_surface(new_surface, 0, 0, \
-			                  new_surface.get_width(), new_surface.get_height())
-
-		self.get_image().set_temp_pixbuf(new_pixbuf)
-		self.common_end_operation(operation)
-
-	def _get_rotation_matrix(self, angle, width, height):
-		"""Transform an angle (in degrees) to the xx/yx/xy/yy coefs expected by
-		cairo. Due to previously performed modifications to the data, the angle
-		will be between 0 (excluded) and 90 (excluded)."""
-		rad = math.pi * angle / 180
-
-		xx = math.cos(rad)
-		xy = math.sin(rad)
-		yx = -1 * math.sin(rad)
-		yy = math.cos(rad)
-
-		x0 = max(0, height * yx)
-		y0 = max(0, width * xy)
-
-		return [xx, yx, xy, yy, x0, y0]
+		if operation['flip_h']:
+			transform.flip(True)
+		if operation['flip_v']:
+			transform.flip(False)
+		transform.rotate(operation['angle'])
+
+		filter_id = self.get_transform_filter(operation)
+		new_pixbuf = transform.apply_to_pixbuf(pixbuf, filter_id)
+		# the size it would have if computed from the full-size pixbuf
+		size = transform.get_size(*full_size)
+		return new_pixbuf, size
 
 	############################################################################
 ################################################################################
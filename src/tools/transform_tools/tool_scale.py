@@ -39,6 +39,10 @@ class ToolScale(AbstractCanvasTool):
 		# safety lock to set values in the spinbuttons
 		self._spinbtns_disabled = True
 
+		# size of the last previewed operation, whose result may not be
+		# computed yet
+		self._previewed_size = (0, 0)
+
 		self._x = 0
 		self._y = 0
 		self._x2 = 0
@@ -190,9 +194,7 @@ class ToolScale(AbstractCanvasTool):
 		self._spinbtns_disabled = True
 
 		if self._preserve_ratio:
-			temp_pixbuf = self.get_image().temp_pixbuf
-			existing_width = temp_pixbuf.get_width()
-			existing_height = temp_pixbuf.get_height()
+			existing_width, existing_height = self._previewed_size
 
 			new_width = self._get_width()
 			new_height = self._get_height()
@@ -318,7 +320,7 @@ class ToolScale(AbstractCanvasTool):
 
 	############################################################################
 
-	def on_draw_above(self, area, cairo_context):
+	def on_draw_above(self, area, cairo_context, visible_rect):
 		if self.apply_to_selection:
 			x1 = int(self._x)
 			y1 = int(self._y)
@@ -329,7 +331,7 @@ class ToolScale(AbstractCanvasTool):
 		y2 = y1 + self._get_height()
 		x1, x2, y1, y2 = self.get_image().get_corrected_coords(x1, x2, y1, y2, \
 		                                         self.apply_to_selection, False)
-		self._draw_temp_pixbuf(cairo_context, x1, y1)
+		self._draw_temp_pixbuf(cairo_context, x1, y1, visible_rect)
 		thickness = self.get_overlay_thickness()
 		utilities_show_handles_on_context(cairo_context, x1, x2, y1, y2, thickness)
 
@@ -353,11 +355,22 @@ class ToolScale(AbstractCanvasTool):
 			source_pixbuf = self.get_selection_pixbuf()
 		else:
 			source_pixbuf = self.get_main_pixbuf()
-		self.get_image().set_temp_pixbuf(source_pixbuf.scale_simple( \
-		                                 operation['width'], \
-		                                 operation['height'], \
-		                                 GdkPixbuf.InterpType.TILES))
-		self.common_end_operation(operation)
+		self._previewed_size = (operation['width'], operation['height'])
+		self.run_transform(operation, self._scale_pixbuf, source_pixbuf)
+
+	def _scale_pixbuf(self, operation, pixbuf, full_size):
+		width = operation['width']
+		height = operation['height']
+		if (pixbuf.get_width(), pixbuf.get_height()) != full_size:
+			# the preview is scaled from a downscaled copy
+			scale_x = pixbuf.get_width() / full_size[0]
+			scale_y = pixbuf.get_height() / full_size[1]
+			new_pixbuf = pixbuf.scale_simple(max(1, round(width * scale_x)), \
+			    max(1, round(height * scale_y)), GdkPixbuf.InterpType.TILES)
+		else:
+			new_pixbuf = pixbuf.scale_simple(width, height, \
+			                                        GdkPixbuf.InterpType.TILES)
+		return new_pixbuf, (width, height)
 
 	############################################################################
 ################################################################################
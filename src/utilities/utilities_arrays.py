@@ -0,0 +1,32 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+# NumPy is an optional dependency: the algorithms using it are much faster than
+# their pure-python versions, but the pure-python versions still exist and are
+# used as a fallback if the module isn't installed.
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+################################################################################
+
+def utilities_numpy_is_available():
+	return numpy is not None
+
+def utilities_surface_as_array(surface):
+	"""Return a numpy array sharing its memory with the pixels of `surface`,
+	which has to be a cairo.ImageSurface using the ARGB32 format. The shape of
+	the array is (height, width, 4); the channels are in the native byte order
+	of cairo (so B, G, R, A on little-endian machines), and premultiplied.
+	The surface is flushed, but the caller has to call `surface.mark_dirty()`
+	after writing in the array."""
+	surface.flush()
+	w = surface.get_width()
+	h = surface.get_height()
+	stride = surface.get_stride()
+	# cairo may pad the rows, so the stride isn't necessarily `w * 4`
+	return numpy.ndarray(shape=(h, w, 4), dtype=numpy.uint8, \
+	            buffer=surface.get_data(), strides=(stride, 4, 1))
+
+################################################################################
+
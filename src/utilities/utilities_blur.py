@@ -1,6 +1,9 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
-import cairo, threading
+import cairo, math, os, multiprocessing, concurrent.futures
+from multiprocessing import shared_memory
+from .utilities_arrays import utilities_numpy_is_available, \
+                              utilities_surface_as_array, numpy
 # from datetime import datetime # Not actually needed, just to measure perfs
 
 class BlurType(int):
@@ -10,6 +13,9 @@ class BlurType(int):
 	PX_BOX_MULTI = 2
 	CAIRO_REPAINTS = 3
 	TILES = 4
+	PX_BOX_NUMPY = 5
+	GAUSSIAN = 6
+	TILES_AVERAGE = 7
 
 class BlurDirection(int):
 	INVALID = -1
@@ -33,17 +39,35 @@ def utilities_blur_surface(surface, radius, blur_type, blur_direction):
 	if blur_type == BlurType.INVALID:
 		return surface
 	elif blur_type == BlurType.AUTO:
-		blur_type = BlurType.PX_BOX
-		# XXX c'est nul ça mdr, mais bon c'est peu utilisé
+		size = surface.get_width() * surface.get_height()
+		if size < MULTI_PROCESS_MIN_PIXELS:
+			blur_type = BlurType.PX_BOX_NUMPY
+		else:
+			blur_type = BlurType.PX_BOX_MULTI
+
+	if blur_type == BlurType.PX_BOX_NUMPY or blur_type == BlurType.PX_BOX_MULTI:
+		if not utilities_numpy_is_available():
+			# same results, but computed much more slowly
+			blur_type = BlurType.PX_BOX
+	elif blur_type == BlurType.GAUSSIAN:
+		if not utilities_numpy_is_available():
+			# 3 pure-python box blurs would be slower than the slow blur
+			blur_type = BlurType.CAIRO_REPAINTS
 
 	if blur_type == BlurType.PX_BOX:
 		blurred_surface = _generic_px_box_blur(surface, radius, blur_direction)
 	elif blur_type == BlurType.PX_BOX_MULTI:
-		blurred_surface = _generic_multi_threaded_blur(surface, radius, blur_direction)
+		blurred_surface = _generic_multi_process_blur(surface, radius, blur_direction)
 	elif blur_type == BlurType.CAIRO_REPAINTS:
 		blurred_surface = _generic_cairo_blur(surface, radius, blur_direction)
 	elif blur_type == BlurType.TILES:
-		blurred_surface = _generic_tiled_blur(surface, radius, blur_direction)
+		blurred_surface = _generic_tiled_blur(surface, radius, blur_direction, False)
+	elif blur_type == BlurType.TILES_AVERAGE:
+		blurred_surface = _generic_tiled_blur(surface, radius, blur_direction, True)
+	elif blur_type == BlurType.PX_BOX_NUMPY:
+		blurred_surface = _generic_numpy_box_blur(surface, radius, blur_direction)
+	elif blur_type == BlurType.GAUSSIAN:
+		blurred_surface = _generic_gaussian_blur(surface, radius, blur_direction)
 
 	# time1 = datetime.now()
 	# print('blurring ended, total time:', time1 - time0)
@@ -162,102 +186,228 @@ def _box_blur_2nd_phase(w, h, channels, radius, pixels, buff0, vmin, vmax, dv):
 			cur_pixel += w * channels
 
 ################################################################################
-# BlurType.PX_BOX_MULTI ########################################################
+# BlurType.PX_BOX_NUMPY ########################################################
 
-def _generic_multi_threaded_blur(surface, radius, blur_direction):
-	"""Experimental multi-threaded blur. The parameter `blur_direction` will be
-	ignored (it always blurs in both directions)."""
+# Number of rows (or columns) blurred at once, to limit the size of the integer
+# arrays allocated by numpy when the image is huge.
+NUMPY_BAND_SIZE = 256
+
+def _generic_numpy_box_blur(surface, radius, blur_direction):
+	"""Same box blur as BlurType.PX_BOX, with exactly the same results, but the
+	sliding windows are computed by numpy using cumulative sums."""
 	w = surface.get_width()
 	h = surface.get_height()
-	channels = 4 # ARGB
 	if radius > w - 1 or radius > h - 1:
-		return
+		return surface
 
 	original = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
 	cairo_context = cairo.Context(original)
-	# cairo_context.set_operator(cairo.Operator.SOURCE)
 	cairo_context.set_source_surface(surface, 0, 0)
 	cairo_context.paint()
-	original.flush()
-	pixels = original.get_data()
+	pixels = utilities_surface_as_array(original)
 
-	buffer0 = [None] * (w * h * channels)
-	vmin = [None] * max(w, h)
-	vmax = [None] * max(w, h)
+	if blur_direction != BlurDirection.VERTICAL:
+		_numpy_box_blur_axis(pixels, radius, 1)
+	if blur_direction != BlurDirection.HORIZONTAL:
+		_numpy_box_blur_axis(pixels, radius, 0)
+	original.mark_dirty()
+	return original
+
+def _numpy_box_blur_axis(pixels, radius, axis, rounded=False):
+	"""Blur in place the array `pixels` along `axis`: 1 is the horizontal
+	phase, 0 is the vertical phase. The image is processed by bands."""
+	nb_lines = pixels.shape[1 - axis]
+	for start in range(0, nb_lines, NUMPY_BAND_SIZE):
+		end = min(start + NUMPY_BAND_SIZE, nb_lines)
+		if axis == 1:
+			band = pixels[start:end]
+		else:
+			band = pixels[:, start:end]
+		band[...] = _numpy_box_blur_band(band, radius, axis, rounded)
+
+def _numpy_box_blur_band(band, radius, axis, rounded=False):
+	"""Return the box-blurred version of `band` along `axis`. Like in the
+	pure-python phases, the window is clamped to the edges of the image (the
+	first and last pixels are repeated), and the sums are floor-divided unless
+	`rounded` is true."""
+	length = band.shape[axis]
 	div = 2 * radius + 1
-	dv = [None] * (256 * div)
-	for i in range(0, len(dv)):
-		dv[i] = int(i / div)
+	positions = numpy.arange(length)
+	lower = numpy.maximum(positions - radius, 0)
+	upper = numpy.minimum(positions + radius, length - 1) + 1
+	nb_first = numpy.maximum(radius - positions, 0)
+	nb_last = numpy.maximum(positions + radius - length + 1, 0)
+
+	# cumulated[i] is the sum of the pixels before the i-th one
+	cumul_shape = list(band.shape)
+	cumul_shape[axis] = length + 1
+	cumulated = numpy.zeros(cumul_shape, dtype=numpy.int32)
+	inner = [slice(None)] * 3
+	inner[axis] = slice(1, None)
+	numpy.cumsum(band, axis=axis, dtype=numpy.int32, out=cumulated[tuple(inner)])
+
+	counts_shape = [1, 1, 1]
+	counts_shape[axis] = length
+	first = numpy.take(band, [0], axis=axis).astype(numpy.int32)
+	last = numpy.take(band, [length - 1], axis=axis).astype(numpy.int32)
+	sums = numpy.take(cumulated, upper, axis=axis)
+	sums -= numpy.take(cumulated, lower, axis=axis)
+	sums += nb_first.reshape(counts_shape) * first
+	sums += nb_last.reshape(counts_shape) * last
+	if rounded:
+		sums += div // 2
+	return (sums // div).astype(numpy.uint8)
 
-	full_buff = _box_blur_1st_phase_multi(w, h, channels, radius, pixels, vmin, vmax, dv)
-	# print('end of the 1st phase…', datetime.now() - time0)
-	_box_blur_2nd_phase(w, h, channels, radius, pixels, full_buff, vmin, vmax, dv)
+################################################################################
+# BlurType.PX_BOX_MULTI ########################################################
 
+# Below this number of pixels, starting the worker processes costs more than
+# what they would save.
+MULTI_PROCESS_MIN_PIXELS = 1000 * 1000
+
+# Maximal number of worker processes: each of them is a new interpreter
+# importing numpy, which isn't worth it beyond a few cores for one blur.
+MAX_PROCESSES = 8
+
+# Minimal number of rows (or columns) of the band blurred by a worker process
+MIN_LINES_PER_PROCESS = 256
+
+_process_pool = None
+
+def _get_process_pool():
+	"""The pool is created the first time it's needed, and then reused. Its
+	processes are spawned rather than forked, because forking a process using
+	GTK isn't safe."""
+	global _process_pool
+	if _process_pool is None:
+		mp_context = multiprocessing.get_context('spawn')
+		_process_pool = concurrent.futures.ProcessPoolExecutor( \
+		                                 _get_nb_processes(), mp_context=mp_context)
+	return _process_pool
+
+def _get_nb_processes(nb_lines=None):
+	"""Number of worker processes to use to blur `nb_lines` rows (or columns),
+	so small images don't start processes that would have nothing to do. The
+	workers are only spawned when they're needed."""
+	nb_processes = min(os.cpu_count() or 1, MAX_PROCESSES)
+	if nb_lines is not None:
+		nb_processes = min(nb_processes, nb_lines // MIN_LINES_PER_PROCESS)
+	return max(1, nb_processes)
+
+def _generic_multi_process_blur(surface, radius, blur_direction):
+	"""Same box blur as BlurType.PX_BOX_NUMPY, with the same results, but the
+	image is split in bands, and each band is blurred by a worker process. The
+	pixels are given to the workers through shared memory."""
+	w = surface.get_width()
+	h = surface.get_height()
+	if radius > w - 1 or radius > h - 1:
+		return surface
+	if w * h < MULTI_PROCESS_MIN_PIXELS or _get_nb_processes(min(w, h)) < 2:
+		return _generic_numpy_box_blur(surface, radius, blur_direction)
+
+	original = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
+	cairo_context = cairo.Context(original)
+	cairo_context.set_source_surface(surface, 0, 0)
+	cairo_context.paint()
+	pixels = utilities_surface_as_array(original)
+
+	try:
+		shm = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+	except OSError:
+		# e.g. if /dev/shm isn't available in a sandbox
+		return _generic_numpy_box_blur(surface, radius, blur_direction)
+	shared = numpy.ndarray(pixels.shape, dtype=numpy.uint8, buffer=shm.buf)
+	shared[...] = pixels
+	try:
+		# Each band is orthogonal to the direction of the blur, so the bands
+		# are independent and can be blurred in place at the same time.
+		if blur_direction != BlurDirection.VERTICAL:
+			_blur_shared_bands(shm.name, pixels.shape, radius, 1)
+		if blur_direction != BlurDirection.HORIZONTAL:
+			_blur_shared_bands(shm.name, pixels.shape, radius, 0)
+		pixels[...] = shared
+	finally:
+		del shared
+		shm.close()
+		shm.unlink()
+	original.mark_dirty()
 	return original
 
-# this code a modified version of a naïve approach to box blur, copied from
-# here: https://github.com/elementary/granite/blob/14e3aaa216b61f7e63762214c0b36ee97fa7c52b/lib/Drawing/BufferSurface.vala#L230
-# the main differences (aside of the language) is the poor attempt to use
-# multithreading (i'm quite sure the access to buffers are not safe at all)
-# during the first phase. Multithreading of the second phase has not even been
-# tried because this multithreaded version is slower than _box_blur_1st_phase
-
-def _box_blur_1st_phase_multi(w, h, channels, radius, pixels, vmin, vmax, dv):
-	NB_THREADS = 4
-	t1 = [None] * NB_THREADS
-	full_buffer = []
-	buffers = []
-	y_end = 0
-	for x in range(0, w):
-		vmin[x] = min(x + radius + 1, w - 1)
-		vmax[x] = max(x - radius, 0)
-	for t in range(0, NB_THREADS):
-		y_start = y_end
-		if t == NB_THREADS - 1:
-			y_end = h
+def _blur_shared_bands(shm_name, shape, radius, axis):
+	"""Blur the shared image along `axis` (1 is the horizontal phase, with bands
+	of rows; 0 is the vertical phase, with bands of columns), and wait for all
+	the workers to finish."""
+	nb_lines = shape[1 - axis]
+	band_size = -(-nb_lines // _get_nb_processes(nb_lines)) # rounded up
+	futures = []
+	for start in range(0, nb_lines, band_size):
+		end = min(start + band_size, nb_lines)
+		futures.append(_get_process_pool().submit(_blur_shared_band, \
+		                             shm_name, shape, radius, axis, start, end))
+	for future in futures:
+		future.result() # re-raises the exceptions of the worker, if any
+
+def _blur_shared_band(shm_name, shape, radius, axis, start, end):
+	"""This is executed by a worker process."""
+	shm = shared_memory.SharedMemory(name=shm_name)
+	try:
+		shared = numpy.ndarray(shape, dtype=numpy.uint8, buffer=shm.buf)
+		if axis == 1:
+			_numpy_box_blur_axis(shared[start:end], radius, axis)
 		else:
-			y_end = y_start + int(h / NB_THREADS)
-		buff_size = w * (y_end - y_start) * channels
-		buff = [0] * buff_size
-		buffers.append(buff)
-		t1[t] = threading.Thread(target=_blur_rows3, args=(x, y_start, y_end, \
-		                     w, channels, radius, pixels, buff, vmin, vmax, dv))
-	for t in range(0, NB_THREADS):
-		t1[t].start()
-	for t in range(0, NB_THREADS):
-		t1[t].join()
-		full_buffer += buffers[t]
-	return full_buffer
-
-def _blur_rows3(x, y0, y1, w, channels, radius, pixels, buff0, vmin, vmax, dv):
-	# print('row thread with', y0, y1, '(begin)')
-	diff = y0 * w * channels
-	for y in range(y0, y1):
-		cur_pixel = y * w * channels
-		asum = radius * pixels[cur_pixel + 0]
-		rsum = radius * pixels[cur_pixel + 1]
-		gsum = radius * pixels[cur_pixel + 2]
-		bsum = radius * pixels[cur_pixel + 3]
-		for i in range(0, radius+1):
-			asum += pixels[cur_pixel + 0]
-			rsum += pixels[cur_pixel + 1]
-			gsum += pixels[cur_pixel + 2]
-			bsum += pixels[cur_pixel + 3]
-			cur_pixel += channels
-		cur_pixel = y * w * channels - diff
-		for x in range(0, w):
-			p1 = (y * w + vmin[x]) * channels
-			p2 = (y * w + vmax[x]) * channels
-			buff0[cur_pixel + 0] = dv[asum]
-			buff0[cur_pixel + 1] = dv[rsum]
-			buff0[cur_pixel + 2] = dv[gsum]
-			buff0[cur_pixel + 3] = dv[bsum]
-			asum += pixels[p1 + 0] - pixels[p2 + 0]
-			rsum += pixels[p1 + 1] - pixels[p2 + 1]
-			gsum += pixels[p1 + 2] - pixels[p2 + 2]
-			bsum += pixels[p1 + 3] - pixels[p2 + 3]
-			cur_pixel += channels
-	# print('row thread with', y0, y1, '(end)')
+			_numpy_box_blur_axis(shared[:, start:end], radius, axis)
+		del shared
+	finally:
+		shm.close()
+
+################################################################################
+# BlurType.GAUSSIAN ############################################################
+
+def _generic_gaussian_blur(surface, radius, blur_direction):
+	"""Approximation of a gaussian blur by 3 successive box blurs, whose widths
+	are computed to match the wanted standard deviation. Each box blur costs the
+	same whatever its width, so the cost per pixel doesn't depend on `radius`.
+	The pixels are premultiplied, so transparent areas don't bleed their color
+	(usually black) onto the visible ones. It requires numpy."""
+	w = surface.get_width()
+	h = surface.get_height()
+	# same standard deviation as the box blur (BlurType.PX_BOX) of this radius
+	sigma = math.sqrt(radius * (radius + 1) / 3)
+	# with small radii, some boxes can be 1 pixel wide, which would be useless
+	box_radii = [r for r in _get_gaussian_box_radii(sigma, 3) if r > 0]
+
+	original = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
+	cairo_context = cairo.Context(original)
+	cairo_context.set_source_surface(surface, 0, 0)
+	cairo_context.paint()
+	pixels = utilities_surface_as_array(original)
+
+	# The results are rounded, otherwise the 3 successive floor divisions
+	# would visibly darken the image.
+	for box_radius in box_radii:
+		if blur_direction != BlurDirection.VERTICAL:
+			_numpy_box_blur_axis(pixels, box_radius, 1, True)
+		if blur_direction != BlurDirection.HORIZONTAL:
+			_numpy_box_blur_axis(pixels, box_radius, 0, True)
+	original.mark_dirty()
+	return original
+
+def _get_gaussian_box_radii(sigma, nb_boxes):
+	"""Return the radii of the `nb_boxes` box blurs whose succession is the
+	closest to a gaussian blur of standard deviation `sigma`. The widths of the
+	boxes are odd integers, the smaller ones being used first.
+	See http://www.peterkovesi.com/papers/FastGaussianSmoothing.pdf"""
+	ideal_width = math.sqrt(12 * sigma * sigma / nb_boxes + 1)
+	lower_width = int(ideal_width)
+	if lower_width % 2 == 0:
+		lower_width -= 1
+	upper_width = lower_width + 2
+	nb_lower = (12 * sigma * sigma - nb_boxes * lower_width * lower_width \
+	       - 4 * nb_boxes * lower_width - 3 * nb_boxes) / (-4 * lower_width - 4)
+	nb_lower = round(nb_lower)
+	widths = [lower_width if i < nb_lower else upper_width \
+	                                                  for i in range(nb_boxes)]
+	return [(width - 1) // 2 for width in widths]
 
 ################################################################################
 # BlurType.CAIRO_REPAINTS ######################################################
@@ -301,9 +451,11 @@ def _cairo_directional_blur(surface, radius, is_vertical):
 	return surface
 
 ################################################################################
-# BlurType.TILES ###############################################################
+# BlurType.TILES and BlurType.TILES_AVERAGE ####################################
 
-def _generic_tiled_blur(surface, radius, blur_direction):
+def _generic_tiled_blur(surface, radius, blur_direction, use_average):
+	"""Each tile is filled with the color of its top-left pixel, or with the
+	average color of its pixels if `use_average` is true."""
 	if blur_direction == BlurDirection.HORIZONTAL:
 		tile_width = radius
 		tile_height = 1
@@ -313,8 +465,67 @@ def _generic_tiled_blur(surface, radius, blur_direction):
 	else:
 		tile_width = radius
 		tile_height = radius
+	if utilities_numpy_is_available():
+		return _get_numpy_tiled_surface(surface, tile_width, tile_height, \
+		                                                            use_average)
+	if use_average:
+		return _get_average_tiled_surface(surface, tile_width, tile_height)
 	return _get_tiled_surface(surface, tile_width, tile_height)
 
+def _get_numpy_tiled_surface(surface, tile_width, tile_height, use_average):
+	"""Same as `_get_tiled_surface`, but each tile is filled at once by
+	broadcasting its color."""
+	pixels = utilities_surface_as_array(surface)
+	h, w = pixels.shape[0:2]
+	if use_average:
+		# the pixels are premultiplied, so the transparent ones don't darken
+		# the average color
+		rows = numpy.arange(0, h, tile_height)
+		columns = numpy.arange(0, w, tile_width)
+		sums = numpy.add.reduceat(pixels, rows, axis=0, dtype=numpy.uint32)
+		sums = numpy.add.reduceat(sums, columns, axis=1)
+		# the tiles on the right and bottom edges may be smaller
+		heights = numpy.minimum(rows + tile_height, h) - rows
+		widths = numpy.minimum(columns + tile_width, w) - columns
+		counts = (heights[:, None] * widths[None, :])[:, :, None]
+		colors = ((sums + counts // 2) // counts).astype(numpy.uint8)
+	else:
+		colors = pixels[::tile_height, ::tile_width]
+	colors = numpy.repeat(colors, tile_height, axis=0)[:h]
+	pixels[...] = numpy.repeat(colors, tile_width, axis=1)[:, :w]
+	surface.mark_dirty()
+	return surface
+
+def _get_average_tiled_surface(surface, tile_width, tile_height):
+	"""Pure-python version of the average of `_get_numpy_tiled_surface`, with
+	the same results. The channels of each row of a tile are summed from a
+	slice of the data, and each row of the result is written at once."""
+	w = surface.get_width()
+	h = surface.get_height()
+	stride = surface.get_stride()
+	surface.flush()
+	pixels = surface.get_data()
+
+	for y in range(0, h, tile_height):
+		rows = range(y, min(y + tile_height, h))
+		new_row = bytearray()
+		for x in range(0, w, tile_width):
+			# the tiles on the right and bottom edges may be smaller
+			nb_columns = min(x + tile_width, w) - x
+			count = len(rows) * nb_columns
+			color = bytearray(4)
+			for channel in range(0, 4):
+				total = 0
+				for row in rows:
+					start = row * stride + x * 4 + channel
+					total += sum(pixels[start:start + nb_columns * 4:4])
+				color[channel] = (total + count // 2) // count
+			new_row += color * nb_columns
+		for row in rows:
+			pixels[row * stride:row * stride + w * 4] = new_row
+	surface.mark_dirty()
+	return surface
+
 def _get_tiled_surface(surface, tile_width, tile_height):
 	w = surface.get_width()
 	h = surface.get_height()
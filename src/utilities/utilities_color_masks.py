@@ -0,0 +1,211 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo
+from gi.repository import Gdk
+from .utilities_arrays import utilities_numpy_is_available, \
+                              utilities_surface_as_array, numpy
+from .utilities_sampling import CHANNELS_RGBA
+
+# Constants to convert sRGB colors to the L*a*b* color space
+SRGB_TO_XYZ = [
+	[0.4124564, 0.3575761, 0.1804375],
+	[0.2126729, 0.7151522, 0.0721750],
+	[0.0193339, 0.1191920, 0.9503041],
+]
+D65_WHITE = [0.95047, 1.0, 1.08883]
+LAB_EPSILON = 216 / 24389
+LAB_KAPPA = 24389 / 27
+
+# Up to this number of colors to erase, the pixels are compared to each color
+# instead of using a lookup table of all the possible colors
+MAX_COLORS_WITHOUT_LOOKUP = 4
+
+# The lookup tables, by tolerance, with the set of the colors they contain:
+# each preview of an operation erases the same colors as the previous one, and
+# maybe a new one, so only the new colors have to be added to the table
+_lookup_cache = {}
+
+################################################################################
+
+def utilities_replace_color(surface, old_rgba, new_rgba, tolerance, \
+                                   use_delta_e=False, bbox=None, mask=None):
+	"""Replace, in one pass on the data of `surface`, the pixels similar to
+	`old_rgba` (4 integers between 0 and 255, not premultiplied, as returned by
+	`utilities_get_rgba_for_xy`) with `new_rgba` (4 values between 0 and 1, as
+	used by cairo).
+
+	Pixels are similar if their alpha channels differ by at most `tolerance`,
+	and if their colors do too: either on each channel (integers between 0 and
+	255), or using the CIE76 ΔE distance between their colors in the L*a*b*
+	space if `use_delta_e` is true. The alpha of a replaced pixel is the new
+	alpha, proportionally to how transparent it was compared to `old_rgba`, so
+	the antialiasing of the edges is preserved.
+
+	The replacement can be limited to a `bbox` (x, y, width, height), and to
+	a `mask` (an A8 surface, aligned on `bbox`).
+
+	It requires numpy: in pure python, looping over the pixels would be much
+	slower than what cairo can do with a mask (see the paint tool)."""
+	if bbox is None:
+		bbox = (0, 0, surface.get_width(), surface.get_height())
+	_numpy_replace_color(surface, old_rgba, new_rgba, tolerance, use_delta_e, \
+	                                                                bbox, mask)
+
+def utilities_erase_colors(surface, rgbas, tolerance, bbox=None):
+	"""Make transparent, in one pass on the data of `surface`, the pixels whose
+	color is similar to any of the colors in `rgbas` (tuples of 4 integers
+	between 0 and 255, not premultiplied). Colors are similar if none of their
+	red, green and blue channels differ by more than `tolerance`. Their alpha
+	isn't compared, and the pixels already transparent are ignored.
+
+	The removal can be limited to a `bbox` (x, y, width, height), which is
+	clamped to the surface.
+
+	Without numpy, only the exact colors are removed (`tolerance` is ignored)
+	by GdkPixbuf, because comparing each pixel in python would be too slow."""
+	if len(rgbas) == 0:
+		return
+	if bbox is None:
+		bbox = (0, 0, surface.get_width(), surface.get_height())
+	bbox = _clamp_bbox(surface, bbox)
+	if bbox[2] <= 0 or bbox[3] <= 0:
+		return
+	if utilities_numpy_is_available():
+		_numpy_erase_colors(surface, rgbas, tolerance, bbox)
+	else:
+		_pixbuf_erase_colors(surface, rgbas, bbox)
+
+def _clamp_bbox(surface, bbox):
+	x, y, width, height = [int(value) for value in bbox]
+	x2 = min(x + width, surface.get_width())
+	y2 = min(y + height, surface.get_height())
+	x = max(x, 0)
+	y = max(y, 0)
+	return (x, y, x2 - x, y2 - y)
+
+################################################################################
+# NumPy versions ###############################################################
+
+def _numpy_replace_color(surface, old_rgba, new_rgba, tolerance, use_delta_e, \
+                                                                  bbox, mask):
+	x, y, width, height = bbox
+	pixels = utilities_surface_as_array(surface)[y:y + height, x:x + width]
+	rgba = _numpy_unpremultiply(pixels)
+	matching = _numpy_get_similar(rgba, old_rgba, tolerance, use_delta_e)
+	if mask is not None:
+		mask.flush()
+		mask_array = numpy.ndarray(shape=(height, width), dtype=numpy.uint8, \
+		              buffer=mask.get_data(), strides=(mask.get_stride(), 1))
+		matching &= mask_array > 0
+
+	new_alpha = numpy.full(rgba.shape[0:2], new_rgba[3] * 255)
+	if old_rgba[3] > 0:
+		new_alpha *= rgba[:, :, 3] / old_rgba[3]
+	new_alpha = numpy.minimum(new_alpha, 255)[matching]
+	for index, channel in enumerate(CHANNELS_RGBA[0:3]):
+		values = new_rgba[index] * new_alpha
+		pixels[:, :, channel][matching] = numpy.rint(values).astype(numpy.uint8)
+	pixels[:, :, CHANNELS_RGBA[3]][matching] = \
+	                                  numpy.rint(new_alpha).astype(numpy.uint8)
+	surface.mark_dirty()
+
+def _numpy_erase_colors(surface, rgbas, tolerance, bbox):
+	x, y, width, height = bbox
+	pixels = utilities_surface_as_array(surface)[y:y + height, x:x + width]
+	rgba = _numpy_unpremultiply(pixels)
+	if len(rgbas) <= MAX_COLORS_WITHOUT_LOOKUP:
+		matching = numpy.zeros(rgba.shape[0:2], dtype=bool)
+		for color in rgbas:
+			delta = numpy.abs(rgba[:, :, 0:3] - numpy.array(color[0:3]))
+			matching |= delta.max(axis=-1) <= tolerance
+	else:
+		lookup = _numpy_get_colors_lookup(rgbas, tolerance)
+		matching = lookup[rgba[:, :, 0], rgba[:, :, 1], rgba[:, :, 2]]
+	matching &= rgba[:, :, 3] > 0
+	pixels[matching] = 0
+	surface.mark_dirty()
+
+def _numpy_get_colors_lookup(rgbas, tolerance):
+	"""Return a 256×256×256 boolean array telling, for each (red, green, blue)
+	color, if it's similar to one of the colors of `rgbas`. It's built once for
+	all the colors, so the pixels are only read once whatever their number.
+	The table is kept for the next call with the same tolerance, where only
+	the colors it doesn't contain yet are added."""
+	rgbs = set(tuple(rgba[0:3]) for rgba in rgbas)
+	if tolerance in _lookup_cache:
+		colors, lookup = _lookup_cache[tolerance]
+		if not colors <= rgbs:
+			# some of its colors aren't erased anymore
+			lookup.fill(False)
+			colors = set()
+	else:
+		lookup = numpy.zeros((256, 256, 256), dtype=bool)
+		colors = set()
+	for rgb in rgbs - colors:
+		ranges = [slice(max(0, c - tolerance), min(255, c + tolerance) + 1) \
+		                                                           for c in rgb]
+		lookup[ranges[0], ranges[1], ranges[2]] = True
+	_lookup_cache[tolerance] = (rgbs, lookup)
+	return lookup
+
+def _numpy_unpremultiply(pixels):
+	"""Return the pixels as integers in the R, G, B, A order, with the colors
+	not premultiplied by the alpha."""
+	rgba = pixels[:, :, list(CHANNELS_RGBA)].astype(numpy.int32)
+	alpha = rgba[:, :, 3:4]
+	safe_alpha = numpy.maximum(alpha, 1)
+	rgba[:, :, 0:3] = (rgba[:, :, 0:3] * 255 + safe_alpha // 2) // safe_alpha
+	return rgba
+
+def _numpy_get_similar(rgba, target_rgba, tolerance, use_delta_e):
+	"""Return the boolean mask of the pixels of `rgba` similar to the color
+	`target_rgba`."""
+	alpha_delta = numpy.abs(rgba[:, :, 3] - target_rgba[3])
+	similar = alpha_delta <= tolerance
+	if use_delta_e:
+		target_lab = _numpy_rgb_to_lab(numpy.array(target_rgba[0:3]))
+		delta = _numpy_rgb_to_lab(rgba[:, :, 0:3]) - target_lab
+		similar &= numpy.sqrt((delta * delta).sum(axis=-1)) <= tolerance
+	else:
+		target = numpy.array(target_rgba[0:3])
+		delta = numpy.abs(rgba[:, :, 0:3] - target)
+		similar &= delta.max(axis=-1) <= tolerance
+	# fully transparent pixels have no color, so they're only similar if the
+	# target is transparent too
+	if target_rgba[3] == 0:
+		similar |= rgba[:, :, 3] == 0
+	else:
+		similar &= rgba[:, :, 3] > 0
+	return similar
+
+def _numpy_rgb_to_lab(rgb):
+	"""Convert sRGB colors (integers between 0 and 255, on the last axis of the
+	array) to the L*a*b* color space, with the D65 illuminant."""
+	rgb = rgb / 255
+	linear = numpy.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, \
+	                                                              rgb / 12.92)
+	xyz = linear @ numpy.array(SRGB_TO_XYZ).T
+	xyz /= numpy.array(D65_WHITE)
+	f = numpy.where(xyz > LAB_EPSILON, numpy.cbrt(xyz), \
+	                                            (LAB_KAPPA * xyz + 16) / 116)
+	lightness = 116 * f[..., 1] - 16
+	a = 500 * (f[..., 0] - f[..., 1])
+	b = 200 * (f[..., 1] - f[..., 2])
+	return numpy.stack((lightness, a, b), axis=-1)
+
+################################################################################
+# Versions without NumPy #######################################################
+
+def _pixbuf_erase_colors(surface, rgbas, bbox):
+	x, y, width, height = bbox
+	pixbuf = Gdk.pixbuf_get_from_surface(surface, x, y, width, height)
+	for rgb in set(tuple(rgba[0:3]) for rgba in rgbas):
+		pixbuf = pixbuf.add_alpha(True, *rgb)
+	cairo_context = cairo.Context(surface)
+	cairo_context.set_operator(cairo.Operator.SOURCE)
+	Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, x, y)
+	cairo_context.rectangle(x, y, width, height)
+	cairo_context.fill()
+
+################################################################################
+
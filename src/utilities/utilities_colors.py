@@ -2,7 +2,7 @@
 
 from gi.repository import Gdk
 
-from .utilities_paths import utilities_get_rgba_for_xy
+from .utilities_sampling import utilities_get_rgba_for_xy
 
 ################################################################################
 
@@ -0,0 +1,163 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo
+from bisect import bisect_right
+from .utilities_arrays import utilities_numpy_is_available, \
+                              utilities_surface_as_array, numpy
+
+################################################################################
+
+def utilities_flood_fill(surface, x, y, tolerance=0, connectivity=4):
+	"""Find the area of pixels similar to the pixel at (x, y), and connected to
+	it. Two pixels are similar if none of their (premultiplied) channels differ
+	by more than `tolerance` (between 0 and 255). The `connectivity` is 4 (only
+	the horizontal and vertical neighbours are connected) or 8 (the diagonal
+	ones too). The area can contain holes (enclaves of other colors).
+
+	Returns a tuple with the mask (a cairo.ImageSurface in the A8 format, where
+	pixels of the area are opaque) and its bounding box (x, y, width, height) in
+	the coordinates of `surface`, or (None, None) if (x, y) isn't on it."""
+	x = int(x)
+	y = int(y)
+	w = surface.get_width()
+	h = surface.get_height()
+	if x < 0 or x >= w or y < 0 or y >= h:
+		return None, None
+
+	get_row_runs = _get_row_runs_function(surface, x, y, tolerance)
+	spans = _get_connected_spans(get_row_runs, x, y, h, connectivity)
+
+	min_x = min(span[1] for span in spans)
+	max_x = max(span[2] for span in spans)
+	min_y = min(span[0] for span in spans)
+	max_y = max(span[0] for span in spans) + 1
+	bbox = (min_x, min_y, max_x - min_x, max_y - min_y)
+
+	mask = cairo.ImageSurface(cairo.Format.A8, bbox[2], bbox[3])
+	data = mask.get_data()
+	stride = mask.get_stride()
+	for span_y, start, end in spans:
+		offset = (span_y - min_y) * stride - min_x
+		data[offset + start:offset + end] = b'\xff' * (end - start)
+	mask.mark_dirty()
+	return mask, bbox
+
+def utilities_path_from_mask(cairo_context, mask, bbox):
+	"""Return a cairo path made of the rectangles covering the opaque pixels of
+	`mask`, an A8 surface whose origin is at (bbox[0], bbox[1])."""
+	cairo_context.new_path()
+	mask.flush()
+	data = mask.get_data()
+	stride = mask.get_stride()
+	width = mask.get_width()
+	for row in range(0, mask.get_height()):
+		row_data = data[row * stride:row * stride + width]
+		if utilities_numpy_is_available():
+			row_array = numpy.frombuffer(row_data, dtype=numpy.uint8)
+			runs = _get_numpy_runs(row_array == 0xff)
+		else:
+			runs = _get_runs(row_data, 0xff)
+		for start, end in runs:
+			cairo_context.rectangle(bbox[0] + start, bbox[1] + row, \
+			                                                  end - start, 1)
+	return cairo_context.copy_path()
+
+################################################################################
+# Private functions ############################################################
+
+def _get_row_runs_function(surface, x, y, tolerance):
+	"""Return a function giving, for the index of a row, the sorted list of the
+	runs of pixels similar to the pixel at (x, y), as (start, end) tuples with
+	an exclusive end. The rows are only analyzed when needed."""
+	surface.flush()
+	w = surface.get_width()
+	stride = surface.get_stride()
+	data = surface.get_data()
+	target = bytes(data[y * stride + x * 4:y * stride + x * 4 + 4])
+	cache = {}
+
+	if utilities_numpy_is_available():
+		pixels = utilities_surface_as_array(surface)
+		target_array = numpy.frombuffer(target, dtype=numpy.uint8)
+		def get_row_runs(row):
+			if row not in cache:
+				delta = numpy.abs(pixels[row].astype(numpy.int16) - target_array)
+				cache[row] = _get_numpy_runs(delta.max(axis=1) <= tolerance)
+			return cache[row]
+	else:
+		def get_row_runs(row):
+			if row not in cache:
+				row_data = data[row * stride:row * stride + w * 4]
+				similar = bytearray(w)
+				for i in range(0, w):
+					for c in range(0, 4):
+						if abs(row_data[i * 4 + c] - target[c]) > tolerance:
+							break
+					else:
+						similar[i] = 1
+				cache[row] = _get_runs(similar, 1)
+			return cache[row]
+	return get_row_runs
+
+def _get_numpy_runs(row_booleans):
+	"""Return the list of the (start, end) runs of true values in the numpy
+	array `row_booleans`."""
+	# the runs start where the values go from 0 to 1, and end where they go
+	# from 1 to 0
+	changes = numpy.diff(row_booleans.astype(numpy.int8), prepend=0, append=0)
+	starts = numpy.flatnonzero(changes == 1)
+	ends = numpy.flatnonzero(changes == -1)
+	return list(zip(starts.tolist(), ends.tolist()))
+
+def _get_runs(row_values, value):
+	"""Return the list of the (start, end) runs of `value` in `row_values`."""
+	runs = []
+	start = None
+	for i, current in enumerate(row_values):
+		if current == value:
+			if start is None:
+				start = i
+		elif start is not None:
+			runs.append((start, i))
+			start = None
+	if start is not None:
+		runs.append((start, len(row_values)))
+	return runs
+
+def _get_connected_spans(get_row_runs, x, y, h, connectivity):
+	"""Starting from the run containing (x, y), find all the runs connected to
+	it, and return them as a list of (y, start, end) tuples."""
+	seed_run = None
+	for start, end in get_row_runs(y):
+		if start <= x < end:
+			seed_run = (y, start, end)
+	visited = set([seed_run])
+	stack = [seed_run]
+	spans = []
+	# with the 8-connectivity, runs touching by a corner are connected too
+	margin = 1 if connectivity == 8 else 0
+
+	while len(stack) > 0:
+		span = stack.pop()
+		spans.append(span)
+		row, start, end = span
+		for next_row in (row - 1, row + 1):
+			if next_row < 0 or next_row >= h:
+				continue
+			runs = get_row_runs(next_row)
+			# the runs are sorted and don't overlap, so the first candidate is
+			# the last run starting before the current one
+			index = max(0, bisect_right(runs, (start - margin, float('inf'))) - 1)
+			while index < len(runs) and runs[index][0] < end + margin:
+				run_start, run_end = runs[index]
+				index += 1
+				if run_end + margin <= start:
+					continue
+				next_span = (next_row, run_start, run_end)
+				if next_span not in visited:
+					visited.add(next_span)
+					stack.append(next_span)
+	return spans
+
+################################################################################
+
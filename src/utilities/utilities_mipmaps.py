@@ -0,0 +1,116 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, math
+
+# Size (in pixels of the full-resolution surface) of the tiles of the levels
+# which are rendered again when a part of the surface has changed. It has to be
+# divisible by the scales of the levels.
+MIPMAPS_TILE_SIZE = 128
+
+################################################################################
+
+class DrMipmaps():
+	"""Pyramid of copies of a surface at 1/2, 1/4, etc. of its size, used to
+	render it zoomed out without filtering all of its pixels at each frame.
+
+	The levels are built lazily, when a zoom level needs them. When a part of
+	the surface changes, the tiles containing it are marked as outdated, and
+	they're rendered again (from the previous level) only when the level is
+	used."""
+	__gtype_name__ = 'DrMipmaps'
+
+	def __init__(self):
+		self.invalidate_all()
+
+	def invalidate_all(self):
+		self._size = None
+		# level `i` has a scale of 1 / 2 ** (i + 1)
+		self._levels = []
+		# for each level, the set of its outdated tiles, as (x, y) indexes
+		self._outdated_tiles = []
+
+	def invalidate(self, x1, y1, x2, y2):
+		"""Mark the tiles containing the area (x1, y1, x2, y2), in pixels of the
+		full-resolution surface, as outdated."""
+		if len(self._levels) == 0:
+			return
+		tile = MIPMAPS_TILE_SIZE
+		tiles = set()
+		tiles_x = range(max(0, math.floor(x1 / tile)), math.ceil(x2 / tile))
+		tiles_y = range(max(0, math.floor(y1 / tile)), math.ceil(y2 / tile))
+		for tile_x in tiles_x:
+			for tile_y in tiles_y:
+				tiles.add((tile_x, tile_y))
+		for outdated_tiles in self._outdated_tiles:
+			outdated_tiles.update(tiles)
+
+	############################################################################
+
+	def get_level(self, source, zoom):
+		"""Return the level to use to render `source` at `zoom`, as a tuple
+		(surface, scale): the smallest level whose scale is still above `zoom`,
+		so it's only downscaled by cairo, and by less than 2. It's None if the
+		full-resolution surface should be used instead.
+		The missing or outdated parts of the levels are rendered from `source`,
+		which has to be the surface the pyramid is a copy of."""
+		if zoom <= 0:
+			return None
+		nb_levels = math.floor(math.log2(1 / zoom))
+		if nb_levels < 1:
+			return None
+
+		size = (source.get_width(), source.get_height())
+		if size != self._size:
+			self.invalidate_all()
+			self._size = size
+		while len(self._levels) < nb_levels:
+			self._add_level(source)
+		for index in range(0, nb_levels):
+			self._update_level(index, source)
+		return (self._levels[nb_levels - 1], 1 / (2 ** nb_levels))
+
+	############################################################################
+	# Private methods ##########################################################
+
+	def _add_level(self, source):
+		if len(self._levels) == 0:
+			previous = source
+		else:
+			previous = self._levels[-1]
+		width = max(1, math.ceil(previous.get_width() / 2))
+		height = max(1, math.ceil(previous.get_height() / 2))
+		level = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+		self._levels.append(level)
+		self._outdated_tiles.append(None) # the whole level has to be rendered
+
+	def _update_level(self, index, source):
+		"""Render the outdated tiles of the level from the previous one (which
+		has to be up to date)."""
+		outdated_tiles = self._outdated_tiles[index]
+		if outdated_tiles is not None and len(outdated_tiles) == 0:
+			return
+		if index == 0:
+			previous = source
+		else:
+			previous = self._levels[index - 1]
+
+		cairo_context = cairo.Context(self._levels[index])
+		if outdated_tiles is not None:
+			size = MIPMAPS_TILE_SIZE / (2 ** (index + 1))
+			for tx, ty in outdated_tiles:
+				cairo_context.rectangle(tx * size, ty * size, size, size)
+			cairo_context.clip()
+		cairo_context.scale(0.5, 0.5)
+		cairo_context.set_operator(cairo.Operator.SOURCE)
+		cairo_context.set_source_surface(previous, 0, 0)
+		# At exactly half the size, the bilinear filter gives the average of
+		# each 2×2 square of pixels, which only belong to one tile. The edges
+		# are extended for the levels with an odd size.
+		cairo_context.get_source().set_filter(cairo.FILTER_BILINEAR)
+		cairo_context.get_source().set_extend(cairo.EXTEND_PAD)
+		cairo_context.paint()
+		self._outdated_tiles[index] = set()
+
+	############################################################################
+################################################################################
+
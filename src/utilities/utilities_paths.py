@@ -1,102 +1,7 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
 import cairo, math
-from gi.repository import Gdk, GdkPixbuf
-from .message_dialog import DrMessageDialog
-
-################################################################################
-
-def utilities_get_rgba_for_xy(surface, x, y):
-	# Guard clause: we can't perform color picking outside of the surface
-	if x < 0 or x > surface.get_width() or y < 0 or y > surface.get_height():
-		return None
-	screenshot = Gdk.pixbuf_get_from_surface(surface, float(x), float(y), 1, 1)
-	rgba_vals = screenshot.get_pixels()
-	return rgba_vals
-
-def utilities_get_magic_path(surface, x, y, window, coef):
-	"""This method tries to build a path defining an area of the same color. It
-	will mainly be used to paint this area, or to select it."""
-	cairo_context = cairo.Context(surface)
-	old_color = utilities_get_rgba_for_xy(surface, x, y)
-
-	# Cairo doesn't provide methods for what we want to do. I will have to
-	# define myself how to decide what should be filled.
-	# The heuristic here is that we create a hull containing the area of
-	# color we want to paint. We don't care about "enclaves" of other colors.
-	while (utilities_get_rgba_for_xy(surface, x, y) == old_color) and y > 0:
-		y = y - 1
-	y = y + 1 # sinon ça crashe ?
-	cairo_context.move_to(x, y)
-	(first_x, first_y) = (x, y)
-
-	# 0 1 2
-	# 7   3
-	# 6 5 4
-
-	direction = 5
-	should_stop = False
-	i = 0
-
-	x_shift = [-1 * coef, 0, coef, coef, coef, 0, -1 * coef, -1 * coef]
-	y_shift = [-1 * coef, -1 * coef, -1 * coef, 0, coef, coef, coef, 0]
-
-	while (not should_stop and i < 50000):
-		new_x = -10
-		new_y = -10
-		end_circle = False
-		j = 0
-		while (not end_circle) or (j < 8):
-			future_x = x+x_shift[direction]
-			future_y = y+y_shift[direction]
-			if (utilities_get_rgba_for_xy(surface, future_x, future_y) == old_color) \
-			and (future_x > 0) and (future_y > 0) \
-			and (future_x < surface.get_width()) \
-			and (future_y < surface.get_height()-2): # ???
-				new_x = future_x
-				new_y = future_y
-				direction = (direction+1) % 8
-			elif (x != new_x or y != new_y):
-				x = new_x+x_shift[direction]
-				y = new_y+y_shift[direction]
-				end_circle = True
-			# else:
-			# 	print('cas emmerdant')
-			j = j+1
-
-		direction = (direction+4) % 8
-		# print('direction :', direction)
-		if (new_x != -10):
-			cairo_context.line_to(x, y)
-		# else:
-		#	 print("TENTATIVE ABUSIVE D'AJOUT")
-		#	 should_stop = True
-
-		if (i > 10) and (first_x-5 < x < first_x+5) and (first_y-5 < y < first_y+5):
-			should_stop = True
-
-		i = i + 1
-		if i == 2000:
-			dialog, continue_id = launch_infinite_loop_dialog(window)
-			result = dialog.run()
-			if result == continue_id: # Continue
-				dialog.destroy()
-			else: # Cancel
-				dialog.destroy()
-				return
-
-	cairo_context.close_path()
-	# print('i: ' + str(i))
-	return cairo_context.copy_path()
-
-def launch_infinite_loop_dialog(window):
-	dialog = DrMessageDialog(window)
-	cancel_id = dialog.set_action(_("Cancel"), None)
-	continue_id = dialog.set_action(_("Continue"), None, True)
-	dialog.add_string(_("The area seems poorly delimited, or is very complex."))
-	dialog.add_string(_("This algorithm may not be able to manage the wanted area."))
-	dialog.add_string(_("Do you want to abort the operation, or to let the tool struggle ?"))
-	return dialog, continue_id
+from array import array
 
 ################################################################################
 
@@ -166,18 +71,53 @@ def utilities_smooth_path(cairo_context, cairo_path):
 	"""Extrapolate a path made of straight lines into a path made of curves. New
 	points are added according to the length of the line it replaces, the length
 	of the previous one, and the length of the next one."""
+	points = [(pts[1][0], pts[1][1]) for pts in cairo_path if pts[1] != ()]
+	utilities_smooth_points(cairo_context, points)
+
+def utilities_smooth_points(cairo_context, points):
+	"""Same as `utilities_smooth_path`, for a path made of `points`, a sequence
+	of (x, y) tuples such as a `DrPointsBuffer`."""
 	x1 = y1 = None
 	x2 = y2 = None
 	x3 = y3 = None
 	x4 = y4 = None
-	for pts in cairo_path:
-		if pts[1] == ():
-			continue
+	for x, y in points:
 		x1, y1, x2, y2, x3, y3, x4, y4 = _next_arc(cairo_context, \
-		                           x2, y2, x3, y3, x4, y4, pts[1][0], pts[1][1])
+		                                       x2, y2, x3, y3, x4, y4, x, y)
 	_next_arc(cairo_context, x2, y2, x3, y3, x4, y4, None, None)
 	# cairo_context.stroke()
 
+def utilities_get_smooth_segment(points, index):
+	"""Return the segment from `points[index]` to `points[index + 1]` as
+	smoothed by `utilities_smooth_path` for a path made of `points`, as a tuple
+	(start, control1, control2, end) whose control points are None if the
+	segment stays straight. Only the 2 neighbouring points on each side matter,
+	so a segment can be computed without smoothing the whole path."""
+	x2, y2 = points[index]
+	x3, y3 = points[index + 1]
+	if index > 0:
+		x1, y1 = points[index - 1]
+	else:
+		x1 = y1 = None
+	if index + 2 < len(points):
+		x4, y4 = points[index + 2]
+	else:
+		x4 = y4 = None
+
+	# same computations as `_next_arc`
+	if x1 is None and x4 is None:
+		return ((x2, y2), None, None, (x3, y3))
+	dist = math.sqrt( (x2 - x3) * (x2 - x3) + (y2 - y3) * (y2 - y3) )
+	if x1 is None:
+		control1 = (x2, y2)
+	else:
+		control1 = _next_point(x1, y1, x2, y2, dist)
+	if x4 is None:
+		control2 = (x3, y3)
+	else:
+		control2 = _next_point(x4, y4, x3, y3, dist)
+	return ((x2, y2), control1, control2, (x3, y3))
+
 def _next_point(x1, y1, x2, y2, dist):
 	coef = 0.1
 	dx = x2 - x1
@@ -209,4 +149,59 @@ def _next_arc(cairo_context, x1, y1, x2, y2, x3, y3, x4, y4):
 	return x1, y1, x2, y2, x3, y3, x4, y4
 
 ################################################################################
+# Points buffer ################################################################
+
+class DrPointsBuffer():
+	"""Growable sequence of points, stored as compact arrays of floats instead
+	of a cairo path copied each time a point is added. The points are (x, y)
+	tuples, with an optional pressure. It's converted to a cairo path only when
+	it's rendered, and it's stored as is in the operations."""
+	__gtype_name__ = 'DrPointsBuffer'
+
+	def __init__(self):
+		self._xs = array('d')
+		self._ys = array('d')
+		# NaN when the pressure is unknown
+		self._pressures = array('d')
+
+	def __len__(self):
+		return len(self._xs)
+
+	def __getitem__(self, index):
+		return (self._xs[index], self._ys[index])
+
+	def __iter__(self):
+		return zip(self._xs, self._ys)
+
+	def append(self, x, y, pressure=None):
+		self._xs.append(x)
+		self._ys.append(y)
+		self._pressures.append(math.nan if pressure is None else pressure)
+
+	def pop(self):
+		"""Remove the last point, and return it as a (x, y) tuple."""
+		self._pressures.pop()
+		return (self._xs.pop(), self._ys.pop())
+
+	def get_pressure(self, index):
+		pressure = self._pressures[index]
+		return None if math.isnan(pressure) else pressure
+
+	def copy(self):
+		points = DrPointsBuffer()
+		points._xs = array('d', self._xs)
+		points._ys = array('d', self._ys)
+		points._pressures = array('d', self._pressures)
+		return points
+
+	def add_to_context(self, cairo_context):
+		"""Add the points to the current path of `cairo_context`, as lines."""
+		if len(self) == 0:
+			return
+		cairo_context.move_to(self._xs[0], self._ys[0])
+		for index in range(1, len(self)):
+			cairo_context.line_to(self._xs[index], self._ys[index])
+
+	############################################################################
+################################################################################
 
@@ -0,0 +1,96 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, sys
+from .utilities_arrays import utilities_numpy_is_available, \
+                              utilities_surface_as_array, numpy
+
+# Pixels of cairo surfaces are 32-bits integers in the native byte order, so
+# the position of each channel in memory depends on the machine.
+if sys.byteorder == 'little':
+	CHANNELS_RGBA = (2, 1, 0, 3)
+else:
+	CHANNELS_RGBA = (1, 2, 3, 0)
+
+# The data of the last sampled surface, which is likely to be sampled again
+_cached_surface = None
+_cached_data = None
+
+################################################################################
+
+def utilities_get_rgba_for_xy(surface, x, y):
+	"""Return the color of the pixel at (x, y) as a tuple of 4 integers between
+	0 and 255 (red, green, blue, alpha, not premultiplied), or None if the
+	coordinates are outside of the surface."""
+	x = int(x)
+	y = int(y)
+	# Guard clause: we can't perform color picking outside of the surface
+	if x < 0 or x >= surface.get_width() or y < 0 or y >= surface.get_height():
+		return None
+	data = _get_surface_data(surface)
+	offset = y * surface.get_stride() + x * 4
+	pixel = [data[offset + channel] for channel in CHANNELS_RGBA]
+	if surface.get_format() == cairo.Format.RGB24:
+		pixel[3] = 255
+	return _unpremultiply(*pixel)
+
+def utilities_get_rgbas_for_xys(surface, coords):
+	"""Batched version of `utilities_get_rgba_for_xy`: return the list of the
+	colors of the pixels whose coordinates are in `coords`, a list of (x, y)
+	tuples. The colors of the coordinates outside of the surface are None."""
+	if not utilities_numpy_is_available():
+		return [utilities_get_rgba_for_xy(surface, x, y) for x, y in coords]
+	if len(coords) == 0:
+		return []
+
+	coords_array = numpy.array(coords, dtype=numpy.float64).astype(numpy.int64)
+	xs = coords_array[:, 0]
+	ys = coords_array[:, 1]
+	inside = (xs >= 0) & (xs < surface.get_width()) & \
+	         (ys >= 0) & (ys < surface.get_height())
+	_get_surface_data(surface) # to flush it, like for a single pixel
+	pixels = utilities_surface_as_array(surface)
+	colors = pixels[ys[inside], xs[inside]][:, CHANNELS_RGBA].astype(numpy.int32)
+	if surface.get_format() == cairo.Format.RGB24:
+		colors[:, 3] = 255
+
+	# same rounding as `_unpremultiply`
+	alpha = colors[:, 3:4]
+	safe_alpha = numpy.maximum(alpha, 1)
+	colors[:, 0:3] = (colors[:, 0:3] * 255 + safe_alpha // 2) // safe_alpha
+	colors[:, 0:3] *= (alpha > 0)
+
+	results = [None] * len(coords)
+	for index, color in zip(numpy.flatnonzero(inside).tolist(), colors.tolist()):
+		results[index] = tuple(color)
+	return results
+
+def utilities_invalidate_sampling(surface=None):
+	"""Forget the cached data of `surface` (or of any surface if it's None).
+	This has to be called when a surface is replaced or destroyed, so its
+	memory isn't retained by the cache."""
+	global _cached_surface, _cached_data
+	if surface is None or surface is _cached_surface:
+		_cached_surface = None
+		_cached_data = None
+
+################################################################################
+
+def _get_surface_data(surface):
+	global _cached_surface, _cached_data
+	if surface is not _cached_surface:
+		_cached_surface = surface
+		_cached_data = surface.get_data()
+	# the memoryview is still valid, but pending drawings have to be done
+	surface.flush()
+	return _cached_data
+
+def _unpremultiply(red, green, blue, alpha):
+	"""Same rounding as `Gdk.pixbuf_get_from_surface`."""
+	if alpha == 0:
+		return (0, 0, 0, 0)
+	half = alpha // 2
+	return ((red * 255 + half) // alpha, (green * 255 + half) // alpha, \
+	                               (blue * 255 + half) // alpha, alpha)
+
+################################################################################
+
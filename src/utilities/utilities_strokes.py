@@ -0,0 +1,256 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, math
+from .utilities_paths import utilities_get_smooth_segment
+
+# The masks cover the area of the stroke, rounded up to this size (in pixels)
+# so they don't have to be allocated again each time the stroke grows a little
+MASKS_SIZE_STEP = 256
+
+################################################################################
+
+class DrIncrementalStroke():
+	"""Renders the preview of a stroke with round joins without stroking the
+	whole path at each frame.
+
+	The segments which can't change anymore are drawn once on a mask. At each
+	frame, only the new segments and the "tail" of the stroke (the last segment
+	and the ones whose smoothing depends on it) are drawn, on a copy of this
+	mask which is then painted on the image. The stroke can have several layers
+	(e.g. an outline and the line itself), each with its own width, color and
+	masks. The masks only cover the area of the stroke, and they're enlarged
+	when the stroke goes out of it, so their cost doesn't depend on the size
+	of the image."""
+	__gtype_name__ = 'DrIncrementalStroke'
+
+	def __init__(self, surface, layers, smooth, antialias, square_caps=False):
+		"""`layers` is a list of (line_width, rgba) tuples, from the lowest to
+		the highest layer. The caps are round, or square if `square_caps`."""
+		self._smooth = smooth
+		self._square_caps = square_caps
+		if antialias:
+			self._antialias = cairo.Antialias.DEFAULT
+		else:
+			self._antialias = cairo.Antialias.NONE
+
+		self._surface_size = (surface.get_width(), surface.get_height())
+		self._device_scale = surface.get_device_scale()
+		# the area (x, y, width, height) of the image covered by the masks,
+		# which are created when something has to be drawn on them
+		self._masks_rect = None
+		self._layers = [(line_width, rgba, None, None) \
+		                                        for line_width, rgba in layers]
+		max_width = max(line_width for line_width, rgba in layers)
+		# the square caps can stick out of the round ones, and the
+		# antialiasing too
+		self._margin = max_width * math.sqrt(2) / 2 + 2
+
+		self._nb_committed = 0 # number of segments drawn on the `committed` masks
+		self._nb_points = 0
+		self._tail_extents = None
+		self._extents = None
+
+	def get_extents(self):
+		"""The area (x1, y1, x2, y2) painted by all the previous frames, or None
+		if nothing has been painted yet."""
+		return self._extents
+
+	############################################################################
+
+	def update(self, points):
+		"""Draw on the masks the changes since the previous frame, for a stroke
+		along `points` (a list of (x, y) tuples where only the last point can
+		change, and new points can be added). Return the area (x1, y1, x2, y2)
+		which has to be painted again on the image, or None."""
+		self._nb_points = len(points)
+		# the last point can still move, and the smoothing of a segment depends
+		# on the next point too
+		nb_unstable = 2 if self._smooth else 1
+		nb_final = max(0, len(points) - 1 - nb_unstable)
+
+		changes = None
+		segments = []
+		if nb_final > self._nb_committed:
+			segments = self._get_segments(points, self._nb_committed, nb_final)
+			changes = self._get_segments_extents(segments)
+		tail_start = max(nb_final, self._nb_committed)
+		tail = self._get_segments(points, tail_start, len(points) - 1)
+		tail_extents = self._get_segments_extents(tail)
+		changes = _get_union(changes, tail_extents)
+		if changes is None:
+			return None
+		self._cover_area(changes)
+
+		if len(segments) > 0:
+			for line_width, rgba, committed, current in self._layers:
+				self._draw_segments(committed, segments, line_width, None)
+			self._nb_committed = nb_final
+
+		# the previous tail is erased from the `current` masks
+		refreshed_area = _get_union(changes, self._tail_extents)
+		for line_width, rgba, committed, current in self._layers:
+			self._draw_segments(current, tail, line_width, refreshed_area, \
+			                                                          committed)
+		self._tail_extents = tail_extents
+		self._extents = _get_union(self._extents, changes)
+		return changes
+
+	def paint(self, cairo_context, restored_area):
+		"""Paint the layers of the stroke with the operator of `cairo_context`.
+		If the image has only been restored in `restored_area` (x1, y1, x2, y2),
+		the stroke is only painted there, the rest of the image already has it
+		from the previous frames."""
+		if self._masks_rect is None:
+			return
+		if restored_area is not None:
+			x1, y1, x2, y2 = restored_area
+			cairo_context.rectangle(x1, y1, x2 - x1, y2 - y1)
+			cairo_context.clip()
+		x, y, width, height = self._masks_rect
+		for line_width, rgba, committed, current in self._layers:
+			cairo_context.set_source_rgba(*rgba)
+			cairo_context.mask_surface(current, x, y)
+
+	############################################################################
+	# Private methods ##########################################################
+
+	def _cover_area(self, extents):
+		"""Enlarge the masks if they don't cover `extents` (x1, y1, x2, y2),
+		clamped to the image, keeping what has been drawn on them."""
+		image_width, image_height = self._surface_size
+		x1 = max(0, min(math.floor(extents[0]), image_width - 1))
+		y1 = max(0, min(math.floor(extents[1]), image_height - 1))
+		x2 = min(image_width, max(math.ceil(extents[2]), x1 + 1))
+		y2 = min(image_height, max(math.ceil(extents[3]), y1 + 1))
+		if self._masks_rect is not None:
+			x, y, width, height = self._masks_rect
+			if x1 >= x and y1 >= y and x2 <= x + width and y2 <= y + height:
+				return
+			x1, y1 = min(x1, x), min(y1, y)
+			x2, y2 = max(x2, x + width), max(y2, y + height)
+		step = MASKS_SIZE_STEP
+		x1 = (x1 // step) * step
+		y1 = (y1 // step) * step
+		x2 = min(image_width, math.ceil(x2 / step) * step)
+		y2 = min(image_height, math.ceil(y2 / step) * step)
+		new_rect = (x1, y1, x2 - x1, y2 - y1)
+
+		layers = []
+		for line_width, rgba, committed, current in self._layers:
+			committed = self._new_mask(new_rect, committed)
+			current = self._new_mask(new_rect, current)
+			layers.append((line_width, rgba, committed, current))
+		self._layers = layers
+		self._masks_rect = new_rect
+
+	def _new_mask(self, rect, previous_mask):
+		"""Return a mask covering `rect`, with the content of `previous_mask`
+		(which covers `_masks_rect`) if it's not None."""
+		x, y, width, height = rect
+		mask = cairo.ImageSurface(cairo.Format.A8, width, height)
+		mask.set_device_scale(*self._device_scale)
+		if previous_mask is not None:
+			cairo_context = cairo.Context(mask)
+			previous_x, previous_y = self._masks_rect[0:2]
+			cairo_context.set_operator(cairo.Operator.SOURCE)
+			cairo_context.set_source_surface(previous_mask, previous_x - x, \
+			                                                    previous_y - y)
+			cairo_context.paint()
+		return mask
+
+	def _get_segments(self, points, start, end):
+		segments = []
+		for index in range(start, end):
+			if self._smooth:
+				segment = utilities_get_smooth_segment(points, index)
+			else:
+				segment = (points[index], None, None, points[index + 1])
+			segments.append((index, segment))
+		return segments
+
+	def _get_segments_extents(self, segments):
+		if len(segments) == 0:
+			return None
+		xs = [pt[0] for i, segment in segments for pt in segment if pt]
+		ys = [pt[1] for i, segment in segments for pt in segment if pt]
+		# a bézier curve is contained in the hull of its control points
+		return [min(xs) - self._margin, min(ys) - self._margin, \
+		        max(xs) + self._margin, max(ys) + self._margin]
+
+	def _draw_segments(self, mask, segments, line_width, area, source=None):
+		"""Stroke `segments` on `mask`. If `source` isn't None, `area` of `mask`
+		is replaced by the same area of `source` first. The masks cover
+		`_masks_rect`, and the coordinates are the ones of the image."""
+		cairo_context = cairo.Context(mask)
+		x, y, width, height = self._masks_rect
+		cairo_context.translate(-1 * x, -1 * y)
+		if source is not None:
+			x1, y1, x2, y2 = area
+			cairo_context.rectangle(x1, y1, x2 - x1, y2 - y1)
+			cairo_context.save()
+			cairo_context.clip()
+			cairo_context.set_operator(cairo.Operator.SOURCE)
+			cairo_context.set_source_surface(source, x, y)
+			cairo_context.paint()
+			cairo_context.restore()
+			cairo_context.new_path()
+		if len(segments) == 0:
+			return
+
+		# With round joins, the stroke of a path is the union of the strokes of
+		# its parts with round caps, so the segments can be stroked separately.
+		cairo_context.set_antialias(self._antialias)
+		cairo_context.set_source_rgba(0.0, 0.0, 0.0, 1.0)
+		cairo_context.set_line_width(line_width)
+		cairo_context.set_line_cap(cairo.LineCap.ROUND)
+		cairo_context.set_line_join(cairo.LineJoin.ROUND)
+		cairo_context.move_to(*segments[0][1][0])
+		for index, (start, control1, control2, end) in segments:
+			if control1 is None:
+				cairo_context.line_to(*end)
+			else:
+				cairo_context.curve_to(*control1, *control2, *end)
+		cairo_context.stroke()
+
+		if not self._square_caps:
+			return
+		# A square cap contains the round one, so it's added at the ends
+		first_index, first_segment = segments[0]
+		if first_index == 0:
+			self._fill_square_cap(cairo_context, first_segment, line_width)
+		last_index, last_segment = segments[-1]
+		if last_index == self._nb_points - 2:
+			reversed_segment = tuple(reversed(last_segment))
+			self._fill_square_cap(cairo_context, reversed_segment, line_width)
+
+	def _fill_square_cap(self, cairo_context, segment, line_width):
+		"""Fill the square cap at the start of `segment`."""
+		x, y = segment[0]
+		# the direction is given by the first point distinct from the start
+		dx, dy = 1.0, 0.0
+		for pt in segment[1:]:
+			if pt is not None and pt != segment[0]:
+				length = math.sqrt((x - pt[0]) ** 2 + (y - pt[1]) ** 2)
+				dx, dy = (x - pt[0]) / length, (y - pt[1]) / length
+				break
+		half = line_width / 2
+		cairo_context.move_to(x - dy * half, y + dx * half)
+		cairo_context.rel_line_to(dx * half, dy * half)
+		cairo_context.rel_line_to(2 * dy * half, -2 * dx * half)
+		cairo_context.rel_line_to(-dx * half, -dy * half)
+		cairo_context.close_path()
+		cairo_context.fill()
+
+	############################################################################
+################################################################################
+
+def _get_union(rect1, rect2):
+	if rect1 is None:
+		return rect2
+	if rect2 is None:
+		return rect1
+	return [min(rect1[0], rect2[0]), min(rect1[1], rect2[1]), \
+	        max(rect1[2], rect2[2]), max(rect1[3], rect2[3])]
+
+################################################################################
+
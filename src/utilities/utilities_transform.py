@@ -0,0 +1,150 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, math
+from gi.repository import Gdk
+
+# Filters to resample the pixels, from the fastest to the nicest
+TRANSFORM_FILTERS = {
+	'nearest': cairo.FILTER_NEAREST,
+	'bilinear': cairo.FILTER_BILINEAR,
+	'good': cairo.FILTER_GOOD,
+}
+
+# Exact cosines and sines of the right angles
+RIGHT_ANGLES = {
+	0: (1.0, 0.0),
+	90: (0.0, 1.0),
+	180: (-1.0, 0.0),
+	270: (0.0, -1.0),
+}
+
+################################################################################
+
+class DrAffineTransform():
+	"""Composition of flips, rotations and skews, applied to a pixbuf at once:
+	its pixels are resampled only one time, whatever the number of steps.
+	If the result only flips the image and rotates it by multiples of 90°, it's
+	done by GdkPixbuf without resampling anything.
+
+	The coefficients have the same meaning as in cairo.Matrix, without the
+	translation, which is deduced from the size of the source."""
+	__gtype_name__ = 'DrAffineTransform'
+
+	def __init__(self):
+		self._coefs = (1.0, 0.0, 0.0, 1.0) # xx, yx, xy, yy
+
+	def flip(self, horizontally):
+		if horizontally:
+			self._compose(-1.0, 0.0, 0.0, 1.0)
+		else:
+			self._compose(1.0, 0.0, 0.0, -1.0)
+
+	def rotate(self, angle):
+		"""Rotate counterclockwise by `angle` degrees."""
+		angle = angle % 360
+		if angle in RIGHT_ANGLES:
+			# so the result can still be done without resampling
+			cos, sin = RIGHT_ANGLES[angle]
+		else:
+			rad = math.radians(angle)
+			cos, sin = math.cos(rad), math.sin(rad)
+		self._compose(cos, -1 * sin, sin, cos)
+
+	def skew(self, xy, yx):
+		self._compose(1.0, yx, xy, 1.0)
+
+	def get_size(self, width, height):
+		"""Size of the result of the transformation of a (width, height)
+		source."""
+		x1, y1, x2, y2 = self._get_extents(width, height)
+		return max(1, round(x2 - x1)), max(1, round(y2 - y1))
+
+	############################################################################
+
+	def apply_to_pixbuf(self, pixbuf, filter_id, rgba=None):
+		"""Return a new pixbuf with the transformed `pixbuf`, resampled with the
+		filter `filter_id` (a key of `TRANSFORM_FILTERS`) if it's needed. The
+		new pixels around the image are transparent, or painted with `rgba` (a
+		normalized array) if it's not None."""
+		right_angles = self._get_right_angles()
+		if right_angles is not None:
+			mirror, rotation = right_angles
+			if mirror:
+				pixbuf = pixbuf.flip(True)
+				if rotation == 0:
+					return pixbuf
+			return pixbuf.rotate_simple(rotation)
+
+		xx, yx, xy, yy = self._coefs
+		try:
+			cairo.Matrix(xx, yx, xy, yy).invert()
+		except cairo.Error:
+			raise ValueError(_("Error: invalid values"))
+		w0 = pixbuf.get_width()
+		h0 = pixbuf.get_height()
+		x1, y1, x2, y2 = self._get_extents(w0, h0)
+		matrix = cairo.Matrix(xx, yx, xy, yy, -1 * x1, -1 * y1)
+		width, height = self.get_size(w0, h0)
+		new_surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+		cairo_context = cairo.Context(new_surface)
+		if rgba is not None:
+			self._paint_outline(cairo_context, matrix, w0, h0, rgba)
+
+		source_surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, 0, None)
+		cairo_context.transform(matrix)
+		cairo_context.set_source_surface(source_surface, 0, 0)
+		cairo_context.get_source().set_filter(TRANSFORM_FILTERS[filter_id])
+		cairo_context.paint()
+		return Gdk.pixbuf_get_from_surface(new_surface, 0, 0, width, height)
+
+	############################################################################
+	# Private methods ##########################################################
+
+	def _compose(self, xx, yx, xy, yy):
+		"""Add a step, applied after the previous ones."""
+		p_xx, p_yx, p_xy, p_yy = self._coefs
+		self._coefs = (xx * p_xx + xy * p_yx, yx * p_xx + yy * p_yx, \
+		               xx * p_xy + xy * p_yy, yx * p_xy + yy * p_yy)
+
+	def _get_extents(self, width, height):
+		xx, yx, xy, yy = self._coefs
+		corners = [(0, 0), (width, 0), (0, height), (width, height)]
+		xs = [xx * x + xy * y for x, y in corners]
+		ys = [yx * x + yy * y for x, y in corners]
+		return min(xs), min(ys), max(xs), max(ys)
+
+	def _get_right_angles(self):
+		"""If the transformation is only made of flips and rotations by
+		multiples of 90°, return the equivalent GdkPixbuf operations as a tuple
+		(mirror, rotation): an horizontal flip or not, followed by a
+		counterclockwise rotation. Return None otherwise."""
+		for mirror in (False, True):
+			for rotation in RIGHT_ANGLES:
+				candidate = DrAffineTransform()
+				if mirror:
+					candidate.flip(True)
+				candidate.rotate(rotation)
+				if candidate._coefs == self._coefs:
+					return mirror, rotation
+		return None
+
+	def _paint_outline(self, cairo_context, matrix, w0, h0, rgba):
+		"""Paint the area around the transformed image with `rgba`."""
+		cairo_context.set_source_rgba(*rgba)
+		cairo_context.paint()
+		cairo_context.save()
+		cairo_context.transform(matrix)
+		cairo_context.rectangle(0, 0, w0, h0)
+		cairo_context.restore()
+		cairo_context.set_operator(cairo.Operator.SOURCE)
+		cairo_context.set_source_rgba(1.0, 1.0, 1.0, 0.0)
+		cairo_context.fill_preserve()
+		# better-looking boundaries
+		cairo_context.set_source_rgba(*rgba)
+		cairo_context.set_line_width(1)
+		cairo_context.stroke()
+		cairo_context.set_operator(cairo.Operator.OVER)
+
+	############################################################################
+################################################################################
+
@@ -0,0 +1,75 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import threading
+from gi.repository import GLib
+
+################################################################################
+
+class DrWorker():
+	"""Runs functions in a background thread, one at a time, so long
+	computations don't freeze the window. The functions shouldn't use GTK or
+	modify anything used by the main loop: their results are given to
+	callbacks, called in the main loop.
+
+	Only the last submitted task matters. Each task has a generation number,
+	and a task is cancelled as soon as the generation changes (because an
+	other task has been submitted, or because of `cancel`): it's not run if it
+	hasn't started yet, and its result is ignored otherwise. The GdkPixbuf
+	and cairo methods don't hold the GIL, so they actually run in parallel
+	with the main loop."""
+	__gtype_name__ = 'DrWorker'
+
+	def __init__(self):
+		self._generation = 0
+		self._pending_task = None
+		self._condition = threading.Condition()
+		self._thread = None
+
+	def submit(self, function, args, callback, error_callback):
+		"""Run `function(*args)` in the background thread, then call
+		`callback(result)` in the main loop, or `error_callback(exception)` if
+		it raised an exception, unless the task has been cancelled meanwhile."""
+		with self._condition:
+			self._generation += 1
+			self._pending_task = (self._generation, function, args, \
+			                                          callback, error_callback)
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, daemon=True)
+				self._thread.start()
+			self._condition.notify()
+
+	def cancel(self):
+		"""Cancel the pending or running task, if any."""
+		with self._condition:
+			self._generation += 1
+			self._pending_task = None
+
+	############################################################################
+	# Private methods ##########################################################
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while self._pending_task is None:
+					self._condition.wait()
+				task = self._pending_task
+				self._pending_task = None
+			generation, function, args, callback, error_callback = task
+			try:
+				result = function(*args)
+			except Exception as e:
+				GLib.idle_add(self._on_done, generation, error_callback, e)
+				continue
+			GLib.idle_add(self._on_done, generation, callback, result)
+
+	def _on_done(self, generation, callback, result):
+		"""This is used as a GSourceFunc so it should return False."""
+		# the generation can't change during this call, it's only modified by
+		# the main loop
+		if generation == self._generation:
+			callback(result)
+		return False
+
+	############################################################################
+################################################################################
+